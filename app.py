@@ -9,6 +9,11 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 # 모듈 임포트 (추후 생성할 파일들)
 from ui.rule_chat import render_rule_builder
 from ui.simulation_dashboard import render_simulation_dashboard
+from ui.monte_carlo_dashboard import render_monte_carlo_dashboard
+from ui.variant_sweep import render_variant_sweep
+from ui.metrics_panel import render_call_metrics_panel
+from core.session_store import load_backup_file, session_store
+from ui.session import current_session_id, restore_session
 
 # 환경 변수 로드
 load_dotenv()
@@ -23,44 +28,38 @@ def main():
     st.sidebar.title("⚙️ 설정 및 백업")
     engine_choice = st.sidebar.radio(
         "시뮬레이션 엔진 선택",
-        ["LLM 기반 (소셜/대화형 게임)", "수학적 강화학습 (업데이트 예정)"]
+        ["LLM 기반 (소셜/대화형 게임)", "수학적 강화학습 (몬테카를로 대량 시뮬레이션)"]
     )
     
     st.sidebar.divider()
     st.sidebar.subheader("💾 게임 데이터 입출력")
     
-    # 데이터 불러오기
-    import json
-    uploaded_file = st.sidebar.file_uploader("저장된 게임 파일 불러오기 (.json)", type="json")
-    if uploaded_file is not None:
+    # 데이터 불러오기 (같은 파일을 리런마다 다시 가져오지 않도록 파일 ID로 구분)
+    current_session_id()
+    uploaded_file = st.sidebar.file_uploader("저장된 게임 파일 불러오기 (.json / .json.gz)", type=["json", "gz"])
+    if uploaded_file is not None and st.session_state.get("imported_file_id") != uploaded_file.file_id:
         try:
-            data = json.load(uploaded_file)
-            if "messages" in data:
-                st.session_state.messages = data["messages"]
-            if "final_rules" in data:
-                st.session_state.final_rules = data["final_rules"]
-            if "sim_logs_history" in data:
-                st.session_state.sim_logs_history = data["sim_logs_history"]
-            if "analysis_feedback" in data:
-                st.session_state.analysis_feedback = data["analysis_feedback"]
+            restore_session(session_store.import_backup(load_backup_file(uploaded_file.getvalue())))
+            st.session_state.imported_file_id = uploaded_file.file_id
             st.sidebar.success("성공적으로 불러왔습니다!")
         except Exception as e:
             st.sidebar.error("파일 업로드 중 오류가 발생했습니다.")
             
-    # 데이터 저장하기
-    export_data = {
-        "messages": st.session_state.get("messages", []),
-        "final_rules": st.session_state.get("final_rules", ""),
-        "sim_logs_history": st.session_state.get("sim_logs_history", ""),
-        "analysis_feedback": st.session_state.get("analysis_feedback", "")
-    }
-    json_string = json.dumps(export_data, ensure_ascii=False, indent=2)
-    st.sidebar.download_button(
-        label="📥 현재 작업 내역 저장하기 (.json)",
-        data=json_string,
-        file_name="game_tester_backup.json",
-        mime="application/json"
-    )
+    # 데이터 저장하기: 저장소의 기록을 차례로 읽어 압축한 백업 파일은 요청할 때만 생성
+    if st.sidebar.button("📦 현재 작업 내역 백업 파일 만들기"):
+        st.session_state.backup_file = session_store.export_gzip(current_session_id())
+    if "backup_file" in st.session_state:
+        if st.sidebar.download_button(
+            label="📥 백업 파일 내려받기 (.json.gz)",
+            data=st.session_state.backup_file,
+            file_name="game_tester_backup.json.gz",
+            mime="application/gzip"
+        ):
+            st.session_state.pop("backup_file", None)
+    
+    st.sidebar.divider()
+    with st.sidebar.expander("⏱️ LLM 호출 지연 및 토큰 사용량"):
+        render_call_metrics_panel()
     
     tab1, tab2 = st.tabs(["💬 게임 규칙 빌더", "📊 시뮬레이션 및 분석"])
     
@@ -73,8 +72,12 @@ def main():
         st.header("시뮬레이션 결과 및 밸런스 검증")
         if engine_choice == "LLM 기반 (소셜/대화형 게임)":
             render_simulation_dashboard()
+            if "final_rules" in st.session_state:
+                st.divider()
+                with st.expander("🧪 규칙 변형 비교 (적응형 스윕)", expanded=bool(st.query_params.get("sweep_job"))):
+                    render_variant_sweep()
         else:
-            st.info("수학적 시뮬레이션 엔진은 현재 준비 중입니다.")
+            render_monte_carlo_dashboard()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1 @@
+# 패키지 인식을 위한 빈 파일
@@ -0,0 +1,202 @@
+"""core.llm_engine의 주요 진입점을 모의 백엔드(MockBackend)로 실행해 엔진 자체의 성능을 측정하는 벤치마크
+
+네트워크 없이 실행되며, 같은 옵션이면 매번 같은 응답이 나오므로 커밋 사이의 성능 변화를 비교할 수 있습니다.
+
+    python -m benchmarks.engine_bench                          # 결과 표 출력
+    python -m benchmarks.engine_bench --json before.json       # 결과 저장
+    python -m benchmarks.engine_bench --compare before.json    # 저장한 결과와 비교
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+# 엔진 임포트 전에 설정: 디스크 캐시/요청 한도가 측정을 왜곡하지 않도록 함
+os.environ.setdefault("LLM_DISK_CACHE", "0")
+os.environ.setdefault("GEMINI_RPM", "1000000")
+os.environ.setdefault("GEMINI_TPM", "1000000000")
+os.environ.setdefault("GEMINI_MAX_CONCURRENCY", "32")
+
+import numpy as np
+
+from core import llm_engine
+from core.llm_backends import MockBackend
+from core.match_stats import append_records, build_analysis_digest, new_results_frame
+
+BENCH_RULES = "\n".join(
+    f"{i}. 밤이 되면 마피아는 상의하여 한 명을 지목하고, 의사는 한 명을 보호하며, 경찰은 한 명의 정체를 조사한다. "
+    "낮에는 모든 생존자가 토론 후 투표로 한 명을 처형한다."
+    for i in range(1, 41)
+)
+
+
+def _percentile(values, q):
+    return float(np.percentile(values, q)) if values else None
+
+
+def _timed_stream(generator):
+    """제너레이터를 끝까지 소비하며 (첫 청크까지 시간, 전체 시간, 출력 글자 수) 측정"""
+    started = time.perf_counter()
+    first = None
+    chars = 0
+    for chunk in generator:
+        if first is None:
+            first = time.perf_counter() - started
+        chars += len(chunk)
+    return first, time.perf_counter() - started, chars
+
+
+def _chat_messages(turns):
+    messages = []
+    for turn in range(turns):
+        messages.append({"role": "user", "content": f"{turn}번째 제안: 경찰 능력을 하루 한 번으로 제한하고 마피아 인원을 조정해 보자."})
+        messages.append({"role": "assistant", "content": "좋습니다. 그 경우 낮 투표의 비중이 커집니다. " * 5})
+    return messages
+
+
+def bench_chat(args):
+    context_state = llm_engine.new_chat_context()
+    messages = []
+    ttfc, latency = [], []
+    for turn in range(args.turns):
+        messages.append({"role": "user", "content": f"{turn}번째 질문: 밸런스를 위해 무엇을 바꾸면 좋을까?"})
+        first, total, _ = _timed_stream(llm_engine.stream_chat_response(messages, context_state))
+        ttfc.append(first)
+        latency.append(total)
+        messages.append({"role": "assistant", "content": "모의 응답입니다. " * 40})
+    return {"calls": args.turns, "ttfc": ttfc, "latency": latency, "elapsed": sum(latency)}
+
+
+def bench_extraction(args):
+    messages = _chat_messages(args.turns)
+    status, latency = None, []
+    for turn in range(1, args.turns + 1):
+        started = time.perf_counter()
+        # 점진적 갱신: 직전 현황 + 새 메시지 2개만 전달
+        status = llm_engine.extract_current_rules(messages[(turn - 1) * 2:turn * 2], status)
+        latency.append(time.perf_counter() - started)
+    return {"calls": args.turns, "ttfc": latency, "latency": latency, "elapsed": sum(latency)}
+
+
+def bench_simulation(args, games_per_call=1):
+    started = time.perf_counter()
+    first_chunk, done_at, records = {}, {}, []
+    for index, kind, payload in llm_engine.run_simulation_matches(BENCH_RULES, args.games, args.concurrency,
+                                                                  games_per_call=games_per_call):
+        now = time.perf_counter() - started
+        if kind == "chunk":
+            first_chunk.setdefault(index, now)
+        else:
+            done_at[index] = now
+            first_chunk.setdefault(index, now)  # 배치 모드는 청크 없이 완료 이벤트만 옴
+            if payload is not None:
+                records.append(payload)
+    elapsed = time.perf_counter() - started
+    parsed = sum(1 for record in records if record["parsed"])
+    return {"calls": args.games, "ttfc": list(first_chunk.values()), "latency": list(done_at.values()),
+            "elapsed": elapsed, "parsed": parsed, "records": records}
+
+
+def bench_analysis(args, records):
+    digest = build_analysis_digest(append_records(new_results_frame(), records))
+    ttfc, latency = [], []
+    for _ in range(args.repeat):
+        llm_engine.response_cache.clear()
+        first, total, _ = _timed_stream(llm_engine.stream_analyze_simulation_results(BENCH_RULES, digest))
+        ttfc.append(first)
+        latency.append(total)
+    return {"calls": args.repeat, "ttfc": ttfc, "latency": latency, "elapsed": sum(latency)}
+
+
+def run_benchmarks(args):
+    """시나리오별 결과 dict 반환 (처리량, 첫 청크 시간/지연의 p50·p95, 호출당 프롬프트 크기)"""
+    backend = MockBackend(first_chunk_latency=args.latency, chunk_delay=args.chunk_delay,
+                          chunk_chars=args.chunk_chars, seed=args.seed)
+    llm_engine.set_backend(backend)
+    if args.no_context_cache:
+        llm_engine.context_cache.create_remote = None
+
+    scenarios = [
+        ("chat", lambda: bench_chat(args)),
+        ("extraction", lambda: bench_extraction(args)),
+        ("simulation", lambda: bench_simulation(args)),
+        (f"simulation_k{args.games_per_call}", lambda: bench_simulation(args, args.games_per_call)),
+    ]
+    results = {}
+    records = []
+    for name, run in scenarios + [("analysis", lambda: bench_analysis(args, records))]:
+        llm_engine.response_cache.clear()
+        calls_before = len(backend.calls)
+        outcome = run()
+        records = outcome.pop("records", records)
+        backend_calls = backend.calls[calls_before:]
+        results[name] = {
+            "units": outcome["calls"],
+            "backend_calls": len(backend_calls),
+            "throughput_per_s": outcome["calls"] / max(outcome["elapsed"], 1e-9),
+            "ttfc_p50": _percentile(outcome["ttfc"], 50),
+            "ttfc_p95": _percentile(outcome["ttfc"], 95),
+            "latency_p50": _percentile(outcome["latency"], 50),
+            "latency_p95": _percentile(outcome["latency"], 95),
+            "prompt_chars": float(np.mean([call["prompt_chars"] for call in backend_calls])) if backend_calls else 0.0,
+            "cached_chars": float(np.mean([call["cached_chars"] for call in backend_calls])) if backend_calls else 0.0,
+        }
+        if "parsed" in outcome:
+            results[name]["parsed"] = outcome["parsed"]
+    return results
+
+
+COLUMNS = ["units", "backend_calls", "throughput_per_s", "ttfc_p50", "ttfc_p95", "latency_p50", "latency_p95",
+           "prompt_chars", "cached_chars"]
+
+
+def _format(value):
+    if value is None:
+        return "-"
+    return f"{value:.3f}" if isinstance(value, float) else str(value)
+
+
+def print_table(results, baseline=None):
+    print("scenario".ljust(16) + "".join(column.rjust(19) for column in COLUMNS))
+    for name, row in results.items():
+        cells = []
+        for column in COLUMNS:
+            cell = _format(row.get(column))
+            before = (baseline or {}).get(name, {}).get(column)
+            if before and isinstance(row.get(column), float):
+                cell += f" ({(row[column] - before) / before:+.0%})"
+            cells.append(cell.rjust(19))
+        print(name.ljust(16) + "".join(cells))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--games", type=int, default=40, help="시뮬레이션 판수")
+    parser.add_argument("--concurrency", type=int, default=8, help="동시에 진행할 판수")
+    parser.add_argument("--games-per-call", type=int, default=5, help="배치 모드 시나리오의 호출당 판수")
+    parser.add_argument("--turns", type=int, default=20, help="채팅/룰 추출 시나리오의 대화 턴 수")
+    parser.add_argument("--repeat", type=int, default=5, help="분석 시나리오 반복 횟수")
+    parser.add_argument("--latency", type=float, default=0.05, help="모의 백엔드의 첫 청크 지연(초)")
+    parser.add_argument("--chunk-delay", type=float, default=0.005, help="모의 백엔드의 청크 간 지연(초)")
+    parser.add_argument("--chunk-chars", type=int, default=40, help="모의 백엔드의 청크당 글자 수")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-context-cache", action="store_true", help="룰북 서버 측 캐시를 끄고 로컬 대체 모드로 측정")
+    parser.add_argument("--json", help="결과를 저장할 JSON 경로")
+    parser.add_argument("--compare", help="이전에 저장한 결과 JSON과 비교해 변화율 표시")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args)
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    print_table(results, baseline)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"options": vars(args), "results": results}, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
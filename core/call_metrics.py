@@ -0,0 +1,117 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import pandas as pd
+
+CALL_COLUMNS = [
+    "timestamp", "session_id", "feature", "prompt_chars", "prompt_tokens", "output_tokens",
+    "ttfc", "latency", "error", "cache_hit", "closed_early",
+]
+
+# 지금 실행 중인 호출을 일으킨 세션 ID (UI 스레드와 백그라운드 작업 스레드에서 각각 설정)
+_current_session = contextvars.ContextVar("call_metrics_session", default=None)
+
+
+def set_metrics_session(session_id):
+    """이 스레드(컨텍스트)에서 이후 일어나는 호출을 session_id의 호출로 기록"""
+    _current_session.set(session_id)
+
+
+def bind_metrics_session(fn):
+    """다른 스레드에서 실행될 fn에 지금의 세션 ID를 이어 붙임 (스레드 풀에 작업을 넘길 때 사용)"""
+    session_id = _current_session.get()
+
+    def _run(*args, **kwargs):
+        token = _current_session.set(session_id)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current_session.reset(token)
+    return _run
+
+
+class CallMetrics:
+    """LLM 호출 1건마다 기능명/프롬프트 크기/토큰/지연/오류/캐시 적중 여부를 기록
+
+    최근 max_records건은 메모리 링 버퍼에 유지하고, jsonl_path를 지정하면 한 줄씩 파일에도 추가합니다.
+    (파일 기록 실패는 호출 자체에 영향을 주지 않도록 무시)
+    각 기록에는 set_metrics_session으로 지정한 세션 ID가 붙어, 여러 테스터가 한 프로세스를 공유해도 나눠 볼 수 있습니다.
+    """
+
+    def __init__(self, max_records=2000, jsonl_path=None):
+        self.jsonl_path = jsonl_path
+        self._records = deque(maxlen=max_records)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def track(self, feature, prompt_chars=0, prompt_tokens=0):
+        """with 블록 동안의 호출 1건을 측정. 블록 안에서 call dict의 값을 채우면 함께 기록
+
+        - call["ttfc"]: 첫 청크까지 시간 (채우지 않으면 전체 지연과 같게 기록)
+        - call["prompt_tokens"]/["output_tokens"]: 실제 사용량을 알면 덮어씀
+        - call["cache_hit"]: 응답 캐시에서 재생했는지
+        스트림 소비 측이 도중에 닫은 경우(GeneratorExit)는 오류 대신 closed_early로 기록합니다.
+        """
+        started = time.monotonic()
+        call = {"session_id": _current_session.get(), "feature": feature, "prompt_chars": prompt_chars, "prompt_tokens": prompt_tokens,
+                "output_tokens": 0, "ttfc": None, "error": None, "cache_hit": False, "closed_early": False}
+        try:
+            yield call
+        except GeneratorExit:
+            call["closed_early"] = True
+            raise
+        except Exception as e:
+            call["error"] = type(e).__name__
+            raise
+        finally:
+            call["latency"] = time.monotonic() - started
+            if call["ttfc"] is None:
+                call["ttfc"] = call["latency"]
+            call["timestamp"] = time.time()
+            self.record(call)
+
+    def record(self, call):
+        with self._lock:
+            self._records.append(call)
+            if self.jsonl_path:
+                try:
+                    os.makedirs(os.path.dirname(self.jsonl_path) or ".", exist_ok=True)
+                    with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                        f.write(json.dumps(call, ensure_ascii=False) + "\n")
+                except OSError:
+                    pass
+
+    def to_frame(self, since=None, session_id=None):
+        """기록을 DataFrame으로 반환 (since: 이 시각(time.time()) 이후 기록만, session_id: 이 세션의 기록만)"""
+        with self._lock:
+            records = [call for call in self._records
+                       if (since is None or call["timestamp"] >= since)
+                       and (session_id is None or call["session_id"] == session_id)]
+        return pd.DataFrame(records, columns=CALL_COLUMNS)
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+
+def summarize_calls(calls_df):
+    """기능별 호출 수, 지연 p50/p95, 첫 청크 p50, 토큰 사용량, 오류/캐시 적중 수"""
+    if calls_df.empty:
+        return pd.DataFrame(columns=["feature", "calls", "latency_p50", "latency_p95", "ttfc_p50",
+                                     "prompt_tokens", "output_tokens", "errors", "cache_hits"])
+    grouped = calls_df.groupby("feature")
+    return pd.DataFrame({
+        "calls": grouped.size(),
+        "latency_p50": grouped["latency"].quantile(0.5),
+        "latency_p95": grouped["latency"].quantile(0.95),
+        "ttfc_p50": grouped["ttfc"].quantile(0.5),
+        "prompt_tokens": grouped["prompt_tokens"].sum(),
+        "output_tokens": grouped["output_tokens"].sum(),
+        "errors": grouped["error"].count(),
+        "cache_hits": grouped["cache_hit"].sum(),
+    }).reset_index().sort_values("latency_p95", ascending=False, ignore_index=True)
@@ -0,0 +1,128 @@
+import hashlib
+import threading
+import time
+
+
+class PrefixContext:
+    """여러 호출이 공유하는 긴 프롬프트 앞부분(룰북 + 시뮬레이터 지시문) 1건
+
+    - remote가 있으면 서버 측 캐시(Gemini CachedContent)에 올라가 있으므로 호출마다 짧은 suffix만 전송
+    - remote가 없으면(로컬 대체 모드) 호출마다 text + suffix를 전송하되, 긴 앞부분의 해시/토큰 추정치는
+      등록 시 한 번만 계산해 응답 캐시 키와 스케줄러 토큰 예약에 재사용
+    """
+
+    def __init__(self, key, model_name, text, tokens, remote=None):
+        self.key = key
+        self.model_name = model_name
+        self.text = text
+        self.tokens = tokens
+        self.remote = remote  # 서버 측 캐시 핸들 (생성 실패/미지원이면 None)
+        self.created_at = time.time()
+
+    def prompt_for(self, suffix):
+        """서버 측 캐시가 없을 때 실제로 전송할 전체 프롬프트"""
+        return suffix if self.remote is not None else self.text + suffix
+
+
+class ContextCache:
+    """앞부분 텍스트 해시로 PrefixContext를 한 번만 등록하고 재사용하는 저장소
+
+    서버 측 캐시 생성/삭제는 create_remote(model_name, text, ttl_seconds), delete_remote(handle)
+    콜백으로 위임하므로 특정 SDK에 묶이지 않습니다. 생성이 실패한 앞부분(최소 토큰 수 미달,
+    미지원 모델 등)은 다시 시도하지 않고 로컬 대체 모드로 사용합니다.
+    """
+
+    def __init__(self, create_remote=None, delete_remote=None, ttl_seconds=60 * 60, min_tokens=0, estimate_tokens=len):
+        self.create_remote = create_remote
+        self.delete_remote = delete_remote
+        self.ttl_seconds = ttl_seconds
+        self.min_tokens = min_tokens
+        self.estimate_tokens = estimate_tokens
+        self._contexts = {}  # key -> PrefixContext
+        self._key_locks = {}  # key -> 서버 측 캐시 생성 중 같은 앞부분의 중복 생성을 막는 잠금
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(model_name, text):
+        return hashlib.sha256(f"{model_name}\n{text}".encode("utf-8")).hexdigest()
+
+    def register(self, model_name, text):
+        """같은 (모델, 앞부분)이면 기존 컨텍스트를 반환하고, 처음이면 서버 측 캐시 생성을 시도
+
+        서버 측 캐시 생성(스케줄러 대기 + 네트워크 요청)은 앞부분별 잠금 안에서만 진행하므로,
+        다른 룰북의 조회/등록은 기다리지 않고 같은 룰북을 동시에 요청한 쪽만 생성이 끝나길 기다립니다.
+        """
+        key = self._key(model_name, text)
+        with self._lock:
+            context = self._contexts.get(key)
+            if context is not None and not self._expired(context):
+                return context
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                context = self._contexts.get(key)
+                if context is not None and not self._expired(context):
+                    return context # 기다리는 동안 다른 요청이 먼저 만듦
+                if context is not None:
+                    self._contexts.pop(key)
+            if context is not None:
+                self._delete(context)
+
+            tokens = self.estimate_tokens(text)
+            remote = None
+            if self.create_remote is not None and tokens >= self.min_tokens:
+                try:
+                    remote = self.create_remote(model_name, text, self.ttl_seconds)
+                except Exception:
+                    remote = None # 서버 측 캐시를 못 쓰면 로컬 대체 모드로 진행
+            context = PrefixContext(key, model_name, text, tokens, remote)
+            with self._lock:
+                self._contexts[key] = context
+            return context
+
+    def _expired(self, context):
+        # 서버 측 캐시는 TTL이 지나면 사라지므로 조금 일찍 새로 만듦
+        return context.remote is not None and time.time() - context.created_at > self.ttl_seconds * 0.9
+
+    def forget_remote(self, context):
+        """서버 측 캐시가 만료/삭제되어 호출이 실패한 경우: 등록을 지우고 서버 측 캐시 삭제를 요청
+
+        이 컨텍스트를 들고 있는 호출은 로컬 대체 모드(전체 프롬프트 전송)로 이어가고,
+        다음 rulebook_context() 호출부터는 서버 측 캐시를 새로 만듭니다.
+        """
+        with self._lock:
+            if self._contexts.get(context.key) is context:
+                self._contexts.pop(context.key)
+        self._delete(context)
+
+    def _delete(self, context):
+        """서버 측 캐시 삭제 (네트워크 요청이므로 _lock 밖에서 호출)"""
+        remote, context.remote = context.remote, None
+        if remote is not None and self.delete_remote is not None:
+            try:
+                self.delete_remote(remote)
+            except Exception:
+                pass # 이미 만료된 캐시 등은 무시 (서버 TTL로 어차피 정리됨)
+
+    def discard(self, model_name, text):
+        """앞부분 1건만 폐기 (다른 사용자가 쓰고 있는 앞부분의 서버 측 캐시는 건드리지 않음)"""
+        with self._lock:
+            context = self._contexts.pop(self._key(model_name, text), None)
+        if context is not None:
+            self._delete(context)
+
+    def invalidate(self):
+        """등록된 모든 앞부분을 폐기 (백엔드를 교체하면 호출)"""
+        with self._lock:
+            contexts = list(self._contexts.values())
+            self._contexts.clear()
+        for context in contexts:
+            self._delete(context)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "contexts": len(self._contexts),
+                "remote": sum(1 for context in self._contexts.values() if context.remote is not None),
+            }
@@ -0,0 +1,217 @@
+import json
+import random
+import re
+import threading
+import time
+
+import google.generativeai as genai
+
+from core.match_stats import format_result_block
+
+
+class LLMChunk:
+    """백엔드가 돌려주는 응답(또는 스트리밍 청크) 1개. 토큰 수를 모르면 None"""
+
+    def __init__(self, text, prompt_tokens=None, output_tokens=None, cached_tokens=None):
+        self.text = text
+        self.prompt_tokens = prompt_tokens
+        self.output_tokens = output_tokens
+        self.cached_tokens = cached_tokens  # 서버 측 캐시에서 읽은 입력 토큰 (prompt_tokens에 포함된 값)
+
+
+class LLMBackend:
+    """llm_engine이 호출하는 모델 백엔드 인터페이스
+
+    - model_name: 응답 캐시 키 등에 쓰이는 모델 식별자
+    - configured: 호출 가능한 상태인지 (API 키 누락 등을 화면에 안내하기 위함)
+    - generate(): 단발성 호출, LLMChunk 1개 반환
+    - stream(): 스트리밍 호출, LLMChunk를 차례로 반환
+      (timeout(초)을 넘기면 응답이 멈춰 있더라도 예외를 내고 끝냄)
+    - create_cached_context()/delete_cached_context(): 긴 공유 앞부분을 서버 측에 캐시
+      (지원하지 않으면 NotImplementedError → 엔진은 로컬 대체 모드로 동작)
+    """
+
+    model_name = None
+    configured = True
+
+    def generate(self, prompt, generation_config=None, cached_context=None):
+        raise NotImplementedError
+
+    def stream(self, prompt, generation_config=None, cached_context=None, timeout=None):
+        raise NotImplementedError
+
+    def create_cached_context(self, text, ttl_seconds):
+        raise NotImplementedError
+
+    def delete_cached_context(self, handle):
+        pass
+
+
+class GeminiBackend(LLMBackend):
+    """google.generativeai 백엔드. 모델 설정과 모델명 결정은 첫 호출 때 한 번만 수행"""
+
+    def __init__(self, api_key, resolve_model_name):
+        self.api_key = api_key
+        self.configured = bool(api_key)
+        self._resolve_model_name = resolve_model_name
+        self._model = None
+        self._model_name = None
+        self._lock = threading.Lock()
+
+    def get_model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    if self.api_key:
+                        genai.configure(api_key=self.api_key)
+                    self._model_name = self._resolve_model_name()
+                    self._model = genai.GenerativeModel(self._model_name)
+        return self._model
+
+    @property
+    def model_name(self):
+        self.get_model()
+        return self._model_name
+
+    @staticmethod
+    def _to_chunk(response):
+        metadata = getattr(response, "usage_metadata", None)
+        return LLMChunk(
+            response.text,
+            prompt_tokens=getattr(metadata, "prompt_token_count", None) if metadata else None,
+            output_tokens=getattr(metadata, "candidates_token_count", None) if metadata else None,
+            cached_tokens=getattr(metadata, "cached_content_token_count", None) if metadata else None,
+        )
+
+    def _model_for(self, cached_context):
+        return cached_context["model"] if cached_context is not None else self.get_model()
+
+    def generate(self, prompt, generation_config=None, cached_context=None):
+        response = self._model_for(cached_context).generate_content(prompt, generation_config=generation_config)
+        return self._to_chunk(response)
+
+    def stream(self, prompt, generation_config=None, cached_context=None, timeout=None):
+        # timeout은 스트림 전체의 요청 기한으로 적용됨 (청크가 멈춰 있어도 기한이 지나면 DeadlineExceeded)
+        request_options = {"timeout": timeout} if timeout else None
+        response = self._model_for(cached_context).generate_content(prompt, generation_config=generation_config, stream=True,
+                                                                    request_options=request_options)
+        for chunk in response:
+            yield self._to_chunk(chunk)
+
+    def create_cached_context(self, text, ttl_seconds):
+        if not self.configured:
+            raise NotImplementedError("API 키가 없어 서버 측 캐시를 만들 수 없습니다.")
+        cached = genai.caching.CachedContent.create(model=self.model_name, display_name="rulebook", contents=[text],
+                                                    ttl=ttl_seconds)
+        return {"cache": cached, "model": genai.GenerativeModel.from_cached_content(cached)}
+
+    def delete_cached_context(self, handle):
+        handle["cache"].delete()
+
+
+# ---------- 로컬 모의 백엔드 (네트워크 없이 엔진 자체의 오버헤드 측정/회귀 확인용) ----------
+MOCK_TEAMS = (("시민팀", ["시민", "의사", "경찰"]), ("마피아팀", ["마피아"]))
+
+_BATCH_COUNT_PATTERN = re.compile(r"게임 (\d+)판")
+
+MOCK_GAME_SPEC = {
+    "title": "모의 마피아",
+    "roles": [
+        {"name": "마피아", "team": "마피아팀", "count": 2, "night_action": "kill"},
+        {"name": "의사", "team": "시민팀", "count": 1, "night_action": "protect"},
+        {"name": "경찰", "team": "시민팀", "count": 1, "night_action": "investigate"},
+        {"name": "시민", "team": "시민팀", "count": 4, "night_action": "none"},
+    ],
+    "teams": [{"name": "시민팀", "win_condition": "eliminate_others"}, {"name": "마피아팀", "win_condition": "parity"}],
+    "day_vote": True,
+    "max_days": 10,
+}
+
+
+def _mock_game(rng):
+    """시민팀/마피아팀 중 하나가 이기는 모의 게임 1판 (narrative + 결과 필드)"""
+    (winner, winning_roles), _ = rng.sample(MOCK_TEAMS, 2)
+    turns = rng.randint(2, 6)
+    narrative = "\n".join(f"{day}일차 낮: 플레이어들이 토론 끝에 한 명을 처형했습니다.\n{day}일차 밤: 능력자들이 행동했습니다."
+                          for day in range(1, turns + 1))
+    surviving = winning_roles[:rng.randint(1, len(winning_roles))]
+    return {"narrative": narrative, "winning_team": winner, "winning_roles": winning_roles,
+            "surviving_roles": surviving, "key_reason": f"{winner}이(가) {turns}일차에 승리 조건을 달성", "turn_count": turns}
+
+
+def mock_script(prompt, generation_config, rng):
+    """프롬프트 종류에 맞춰 형식이 올바른 모의 응답 생성 (배치 JSON / 게임 명세 / 결과 요약 블록 / 일반 텍스트)"""
+    config = generation_config or {}
+    if config.get("response_schema"):
+        match = _BATCH_COUNT_PATTERN.search(prompt)
+        return json.dumps([_mock_game(rng) for _ in range(int(match.group(1)) if match else 1)], ensure_ascii=False)
+    if config.get("response_mime_type") == "application/json":
+        return json.dumps(MOCK_GAME_SPEC, ensure_ascii=False)
+    if "1판의 게임을 시뮬레이션" in prompt:
+        game = _mock_game(rng)
+        return game["narrative"] + "\n\n" + format_result_block(
+            game["winning_team"], game["winning_roles"], game["surviving_roles"], game["key_reason"], game["turn_count"]) + "\n"
+    return "모의 응답입니다. " * 40
+
+
+class MockBackend(LLMBackend):
+    """결정적인 로컬 모의 백엔드
+
+    - first_chunk_latency: 첫 청크까지 지연(초), chunk_delay: 이후 청크 사이 지연(초)
+    - chunk_chars: 청크 1개의 글자 수
+    - script: 응답을 정하는 함수 (prompt, generation_config, rng) -> 텍스트, 또는 차례로 돌려줄 텍스트 리스트
+    - seed: 같은 seed면 n번째 호출의 응답이 항상 같음
+    호출마다 프롬프트 길이(서버 측 캐시에 둔 앞부분은 따로)를 calls에 기록합니다. 토큰 수는 글자 수를 2로 나눈 대략적인 값입니다.
+    """
+
+    def __init__(self, first_chunk_latency=0.05, chunk_delay=0.01, chunk_chars=40, script=None, seed=0, model_name="mock"):
+        self.first_chunk_latency = first_chunk_latency
+        self.chunk_delay = chunk_delay
+        self.chunk_chars = chunk_chars
+        self.script = script or mock_script
+        self.seed = seed
+        self.model_name = model_name
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def _respond(self, prompt, generation_config, cached_context):
+        with self._lock:
+            call_index = len(self.calls)
+            cached_chars = len(cached_context["text"]) if cached_context is not None else 0
+            self.calls.append({"prompt_chars": len(prompt), "cached_chars": cached_chars})
+        if isinstance(self.script, (list, tuple)):
+            text = self.script[call_index % len(self.script)]
+        else:
+            text = self.script((cached_context["text"] if cached_context is not None else "") + prompt,
+                               generation_config, random.Random(f"{self.seed}:{call_index}"))
+        usage = {"prompt_tokens": (len(prompt) + cached_chars) // 2 or 1, "cached_tokens": cached_chars // 2,
+                 "output_tokens": len(text) // 2 or 1}
+        return text, usage
+
+    def generate(self, prompt, generation_config=None, cached_context=None):
+        text, usage = self._respond(prompt, generation_config, cached_context)
+        pieces = max(1, -(-len(text) // self.chunk_chars))
+        time.sleep(self.first_chunk_latency + self.chunk_delay * (pieces - 1))
+        return LLMChunk(text, **usage)
+
+    def stream(self, prompt, generation_config=None, cached_context=None, timeout=None):
+        text, usage = self._respond(prompt, generation_config, cached_context)
+        deadline = time.monotonic() + timeout if timeout else None
+
+        def _wait(seconds):
+            # 실제 API의 요청 기한처럼, 다음 청크가 기한 안에 오지 않으면 기한까지만 기다린 뒤 TimeoutError
+            if deadline is not None and time.monotonic() + seconds > deadline:
+                time.sleep(max(0.0, deadline - time.monotonic()))
+                raise TimeoutError("모의 백엔드 요청 기한 초과")
+            time.sleep(seconds)
+
+        _wait(self.first_chunk_latency)
+        for start in range(0, len(text), self.chunk_chars):
+            if start:
+                _wait(self.chunk_delay)
+            # 실제 API처럼 사용량은 마지막 청크에만 포함
+            is_last = start + self.chunk_chars >= len(text)
+            yield LLMChunk(text[start:start + self.chunk_chars], **(usage if is_last else {}))
+
+    def create_cached_context(self, text, ttl_seconds):
+        return {"text": text}
@@ -1,6 +1,20 @@
+import json
 import os
+import queue
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import google.generativeai as genai
 from dotenv import load_dotenv
+from core.call_metrics import CallMetrics, bind_metrics_session
+from core.context_cache import ContextCache
+from core.llm_backends import GeminiBackend, MockBackend
+from core.match_stats import MatchStreamMonitor, parse_match_result, record_from_game_json
+from core.monte_carlo import validate_game_spec
+from core.response_cache import ResponseCache, make_cache_key
+from core.scheduler import (PRIORITY_BATCH, PRIORITY_INTERACTIVE, PRIORITY_NORMAL, RequestScheduler, is_missing_cache_error,
+                            is_retryable_error, is_timeout_error)
 
 # 환경 변수 로드
 load_dotenv()
@@ -14,21 +28,242 @@ if not API_KEY:
     except Exception:
         pass
 
-if API_KEY:
-    genai.configure(api_key=API_KEY)
-    
+if not API_KEY:
+    print("경고: GEMINI_API_KEY가 설정되지 않았습니다.")
+
+DEFAULT_MODEL_NAME = "models/gemini-flash"
+# 환경 변수로 모델을 고정하면 모델 탐색(list_models) 자체를 건너뜁니다.
+MODEL_NAME_ENV = "GEMINI_MODEL_NAME"
+# 탐색한 모델명을 디스크에 저장해 두고 재시작 시 재사용 (TTL 경과 시 다시 탐색)
+MODEL_CACHE_PATH = os.getenv("GEMINI_MODEL_CACHE_PATH", os.path.join(".cache", "model_name.json"))
+MODEL_CACHE_TTL_SECONDS = int(os.getenv("GEMINI_MODEL_CACHE_TTL", str(24 * 60 * 60)))
+
+# LLM_BACKEND=mock 이면 네트워크 없이 core.llm_backends.MockBackend로 동작 (오프라인 시연/벤치마크용)
+LLM_BACKEND_ENV = "LLM_BACKEND"
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def _load_cached_model_name():
+    """디스크 캐시에 저장된 모델명이 유효기간 이내라면 반환"""
+    try:
+        with open(MODEL_CACHE_PATH, encoding="utf-8") as f:
+            cached = json.load(f)
+        if time.time() - cached["resolved_at"] < MODEL_CACHE_TTL_SECONDS:
+            return cached["model_name"]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return None
+
+def _save_cached_model_name(model_name):
+    try:
+        os.makedirs(os.path.dirname(MODEL_CACHE_PATH) or ".", exist_ok=True)
+        with open(MODEL_CACHE_PATH, "w", encoding="utf-8") as f:
+            json.dump({"model_name": model_name, "resolved_at": time.time()}, f)
+    except OSError:
+        pass
+
+def _resolve_model_name():
+    """환경 변수 → 디스크 캐시 → 모델 탐색 순서로 사용할 모델명 결정"""
+    override = os.getenv(MODEL_NAME_ENV)
+    if override:
+        return override
+    if not API_KEY:
+        return DEFAULT_MODEL_NAME
+
+    cached = _load_cached_model_name()
+    if cached:
+        return cached
+
     try:
         # 가용한 모델 중 가장 최신 버전의 flash 모델을 자동 선택 (하드코딩으로 인한 404 에러 방지)
         available_models = [m.name for m in genai.list_models() if 'flash' in m.name and 'generateContent' in m.supported_generation_methods]
-        MODEL_NAME = available_models[-1] if available_models else "models/gemini-flash" # 가장 최신 버전 혹은 기본 별칭 사용
+        if not available_models:
+            return DEFAULT_MODEL_NAME
+        model_name = available_models[-1] # 가장 최신 버전
     except Exception:
-        MODEL_NAME = "models/gemini-flash"
-else:
-    print("경고: GEMINI_API_KEY가 설정되지 않았습니다.")
-    MODEL_NAME = "models/gemini-flash"
+        # 탐색 실패는 캐시하지 않아 다음 실행 때 다시 시도
+        return DEFAULT_MODEL_NAME
+    _save_cached_model_name(model_name)
+    return model_name
+
+def get_backend():
+    """프로세스 전체에서 공유하는 LLM 백엔드를 처음 필요할 때 한 번만 생성
+
+    모듈 임포트 시에는 네트워크 호출이 일어나지 않으며, Gemini 백엔드는 여러 스레드(동시 시뮬레이션)에서
+    동시에 호출해도 모델 탐색을 한 번만 수행합니다.
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if os.getenv(LLM_BACKEND_ENV, "gemini") == "mock":
+                    _backend = MockBackend()
+                else:
+                    _backend = GeminiBackend(API_KEY, _resolve_model_name)
+    return _backend
+
+def set_backend(backend):
+    """엔진이 사용할 백엔드 교체 (벤치마크/오프라인 실행용). 이전 백엔드로 등록한 공유 앞부분은 폐기"""
+    global _backend
+    with _backend_lock:
+        _backend = backend
+    context_cache.invalidate()
+
+def get_model_name():
+    """현재 사용 중인 모델명 (필요 시 모델 초기화 포함)"""
+    return get_backend().model_name
+
+def __getattr__(name):
+    # 예전 코드의 `llm_engine.MODEL_NAME` 접근도 지연 초기화를 거치도록 유지
+    if name == "MODEL_NAME":
+        return get_model_name()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# 동일한 프롬프트 재전송(리런, 새로고침, 버튼 반복 클릭)을 막기 위한 응답 캐시
+# LLM_DISK_CACHE=0 으로 디스크 계층을 끌 수 있습니다.
+response_cache = ResponseCache(
+    max_memory_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "256")),
+    disk_path=None if os.getenv("LLM_DISK_CACHE", "1") == "0" else os.getenv("LLM_CACHE_PATH", os.path.join(".cache", "llm_responses.sqlite")),
+    max_disk_bytes=int(os.getenv("LLM_CACHE_MAX_BYTES", str(50 * 1024 * 1024))),
+    ttl_seconds=int(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 60 * 60))),
+)
 
-# 모델 설정
-model = genai.GenerativeModel(MODEL_NAME)
+def _record_usage(chunk, usage):
+    """LLMChunk의 사용량을 usage(dict)에 기록. prompt_tokens는 서버 측 캐시에서 읽은 토큰을 뺀, 새로 보낸 입력 토큰"""
+    if chunk.prompt_tokens:
+        usage["prompt_tokens"] = chunk.prompt_tokens - (chunk.cached_tokens or 0)
+    if chunk.output_tokens:
+        usage["output_tokens"] = chunk.output_tokens
+
+# 모든 Gemini 호출이 거쳐 가는 공용 스케줄러 (같은 API 키를 쓰는 여러 테스터가 한 배포를 공유하는 상황 대비)
+scheduler = RequestScheduler(
+    rpm=int(os.getenv("GEMINI_RPM", "60")),
+    tpm=int(os.getenv("GEMINI_TPM", "1000000")),
+    max_concurrency=int(os.getenv("GEMINI_MAX_CONCURRENCY", "8")),
+    target_latency=float(os.getenv("GEMINI_TARGET_LATENCY", "15")),
+)
+
+# 호출별 계측 (사이드바 패널에서 기능별 지연/토큰 사용량 확인용)
+# LLM_METRICS_PATH를 지정하면 모든 호출 기록을 JSONL 파일에도 남깁니다.
+call_metrics = CallMetrics(
+    max_records=int(os.getenv("LLM_METRICS_MAX_RECORDS", "2000")),
+    jsonl_path=os.getenv("LLM_METRICS_PATH") or None,
+)
+
+def _charge_output_tokens(chunk, text):
+    scheduler.charge_tokens((chunk.output_tokens if chunk is not None else None) or estimate_tokens(text))
+
+def _generate_text(prompt, generation_config=None, use_cache=True, priority=PRIORITY_INTERACTIVE, feature="llm_call"):
+    """단발성 호출 공통 경로 (캐시 조회 → 스케줄러 대기 → 모델 호출 → 캐시 저장)
+
+    feature는 호출 계측(call_metrics)에 기록할 기능 이름입니다.
+    """
+    with call_metrics.track(feature, len(prompt), estimate_tokens(prompt)) as call:
+        key = make_cache_key(get_model_name(), prompt, generation_config) if use_cache else None
+        if key:
+            cached = response_cache.get(key)
+            if cached is not None:
+                call.update(cache_hit=True, prompt_tokens=0)
+                return "".join(cached)
+
+        response = scheduler.call(lambda: get_backend().generate(prompt, generation_config), priority, estimate_tokens(prompt))
+        text = response.text
+        usage = {}
+        _record_usage(response, usage)
+        call["prompt_tokens"] = usage.get("prompt_tokens", call["prompt_tokens"])
+        call["output_tokens"] = usage.get("output_tokens") or estimate_tokens(text)
+        _charge_output_tokens(response, text)
+        if key:
+            response_cache.put(key, [text])
+        return text
+
+def _stream_text(prompt, generation_config=None, use_cache=True, usage=None, priority=PRIORITY_INTERACTIVE, context=None,
+                 feature="llm_call", timeout=None, on_start=None):
+    """스트리밍 호출 공통 경로. 캐시 적중 시 저장된 청크를 같은 단위로 재생합니다.
+
+    끝까지 정상적으로 받은 응답만 캐시에 저장하므로, 도중에 오류가 나거나 소비 측이
+    스트림을 닫으면 잘린 응답이 캐시되지 않습니다.
+    usage(dict)를 넘기면 백엔드가 알려 준 사용량으로 prompt_tokens/output_tokens를 채웁니다.
+    (캐시 재생 시에는 새로 소비한 토큰이 없으므로 채우지 않음)
+    첫 청크를 받기 전에 난 일시적 오류만 재시도합니다. (이미 화면에 나간 청크는 되돌릴 수 없으므로)
+    context(PrefixContext)를 넘기면 prompt는 공유 앞부분 뒤에 붙는 짧은 suffix로 취급합니다.
+    feature는 호출 계측(call_metrics)에 기록할 기능 이름입니다.
+    timeout(초)은 첫 요청을 보낸 시점부터 재시도까지 모두 합친 기한입니다. 요청마다 남은 시간을 백엔드에 넘겨
+    청크가 멈춘 스트림도 기한이 지나면 끝나며, 기한을 넘겨 끊긴 요청은 재시도하지 않습니다.
+    on_start()는 스케줄러 슬롯을 얻어 첫 요청을 보내기 직전에 한 번 호출됩니다. (대기 시간을 빼고 시간 한도를 재기 위함)
+    """
+    usage = usage if usage is not None else {}
+    sent_prompt = context.prompt_for(prompt) if context is not None else prompt
+    tracked_at = time.monotonic()
+    with call_metrics.track(feature, len(sent_prompt), estimate_tokens(sent_prompt)) as call:
+        cache_prompt = f"{context.key}\n{prompt}" if context is not None else prompt
+        key = make_cache_key(get_model_name(), cache_prompt, generation_config) if use_cache else None
+        if key:
+            cached = response_cache.get(key)
+            if cached is not None:
+                call.update(cache_hit=True, prompt_tokens=0)
+                yield from cached
+                return
+
+        estimated_tokens = estimate_tokens(prompt) + (context.tokens if context is not None else 0)
+        chunks = []
+        output_estimate = 0
+        response = None  # 마지막으로 받은 청크 (사용량이 담겨 있음)
+        attempt = 0
+        deadline = None  # 첫 요청을 보낸 시점 + timeout (재시도에도 그대로 적용)
+        first_started = None
+        while True:
+            remote = context.remote if context is not None else None
+            try:
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise TimeoutError("시간 한도를 넘겨 더 이상 재시도하지 않습니다")
+                with scheduler.slot(priority, estimated_tokens) as slot:
+                    started = time.monotonic()
+                    if first_started is None:
+                        first_started = started
+                        deadline = started + timeout if timeout is not None else None
+                        if on_start is not None:
+                            on_start()
+                    request_timeout = deadline - started if deadline is not None else None
+                    if request_timeout is not None and request_timeout <= 0:
+                        raise TimeoutError("재시도 대기 중에 시간 한도를 넘겼습니다")
+                    full_prompt = context.prompt_for(prompt) if context is not None else prompt
+                    for chunk in get_backend().stream(full_prompt, generation_config, cached_context=remote,
+                                                      timeout=request_timeout):
+                        _record_usage(chunk, usage)
+                        if chunk.text:
+                            if not chunks:
+                                # 스트리밍은 첫 청크까지의 시간을 AIMD 지연 지표로 사용
+                                slot["latency"] = time.monotonic() - started
+                                call["ttfc"] = time.monotonic() - tracked_at
+                            chunks.append(chunk.text)
+                            # 소비 측이 도중에 스트림을 닫아도 그때까지의 사용량이 기록되도록 청크마다 갱신
+                            output_estimate += estimate_tokens(chunk.text)
+                            call["prompt_tokens"] = usage.get("prompt_tokens", call["prompt_tokens"])
+                            call["output_tokens"] = usage.get("output_tokens") or output_estimate
+                            yield chunk.text
+                        response = chunk
+                break
+            except Exception as e:
+                if remote is not None and not chunks and is_missing_cache_error(e):
+                    # 서버 측 캐시가 만료/삭제된 경우: 전체 프롬프트를 보내는 로컬 대체 모드로 바로 재시도
+                    # (remote가 없어지므로 한 번만 일어나며, 재시도 횟수는 쓰지 않음. 다음 판부터는 캐시를 새로 만듦)
+                    context_cache.forget_remote(context)
+                    continue
+                if chunks or attempt >= scheduler.max_retries or not is_retryable_error(e):
+                    raise
+                if deadline is not None and is_timeout_error(e):
+                    raise # 전체 시간 한도를 다 썼으므로 재시도하지 않음
+            delay = scheduler.backoff_delay(attempt)
+            time.sleep(min(delay, max(0.0, deadline - time.monotonic())) if deadline is not None else delay)
+            attempt += 1
+
+        call["prompt_tokens"] = usage.get("prompt_tokens", call["prompt_tokens"])
+        call["output_tokens"] = usage.get("output_tokens") or output_estimate
+        _charge_output_tokens(response, "".join(chunks))
+        if key:
+            response_cache.put(key, chunks)
 
 SYSTEM_PROMPT = """너는 아주 뛰어나고 창의적인 보드게임 및 MT 게임 디자인 마스터 전문가야. 
 초보 사용자가 게임에 대한 대략적인 아이디어를 주면, 너가 리드해서 게임의 제목, 참가자 수, 
@@ -37,132 +272,648 @@ SYSTEM_PROMPT = """너는 아주 뛰어나고 창의적인 보드게임 및 MT 
 질문은 한 번에 하나씩 하거나 선택지를 줘서 쉽게 대답할 수 있게 해. 
 마피아 게임, 더 지니어스 게임(먹이사슬 등) 등 다양한 심리전 게임의 구조를 잘 이해하고 있어야 해."""
 
-def get_chat_response(messages_history):
-    """ Streamlit의 session_state.messages 구조를 받아서 Gemini 응답 생성 """
+# 롤링 요약 컨텍스트 설정: 최근 K개 메시지는 원문 그대로, 그 이전은 요약본으로 전달
+CHAT_RECENT_MESSAGES = int(os.getenv("CHAT_RECENT_MESSAGES", "8"))
+CHAT_CONTEXT_TOKEN_BUDGET = int(os.getenv("CHAT_CONTEXT_TOKEN_BUDGET", "6000"))
+
+def estimate_tokens(text):
+    """토크나이저 호출 없이 대략적인 토큰 수 추정 (영문 약 4자, 한글 약 1.5자당 1토큰)"""
+    if not text:
+        return 0
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return int(ascii_chars / 4 + (len(text) - ascii_chars) / 1.5) + 1
+
+def _role_name(msg):
+    return "게임 마스터" if msg["role"] == "assistant" or msg["role"] == "model" else "사용자"
+
+def new_chat_context():
+    """session_state와 JSON 백업에 그대로 저장할 수 있는 롤링 요약 상태"""
+    return {"summary": "", "summarized_count": 0, "last_prompt_tokens": 0}
+
+class RollingChatContext:
+    """오래된 대화는 누적 요약으로, 최근 K개 메시지는 원문으로 유지하는 대화 컨텍스트 관리자
+
+    state(dict)를 직접 갱신하므로 st.session_state에 보관한 dict를 넘기면 리런이나 백업 복원 후에도
+    이미 요약한 구간을 다시 요약하지 않습니다. 요약은 새로 밀려난 메시지만 이전 요약에 덧붙이는
+    방식으로 점진적으로 갱신됩니다.
+    """
+
+    def __init__(self, state=None, keep_recent=CHAT_RECENT_MESSAGES, token_budget=CHAT_CONTEXT_TOKEN_BUDGET):
+        self.state = state if state is not None else new_chat_context()
+        self.keep_recent = keep_recent
+        self.token_budget = token_budget
+        self.fold_batch = max(2, keep_recent // 2)
+
+    def _verbatim(self, history):
+        return history[self.state["summarized_count"]:]
+
+    def update(self, history):
+        """최근 K개 / 토큰 예산을 넘는 오래된 메시지를 요약본에 편입"""
+        # 백업 복원 등으로 대화 내역이 바뀌어 요약 범위가 맞지 않으면 처음부터 다시 구성
+        if self.state.get("summarized_count", 0) > len(history):
+            self.state.update(new_chat_context())
+
+        verbatim = self._verbatim(history)
+        # 매 턴 요약 호출이 생기지 않도록 K개보다 일정량 더 쌓였을 때 한꺼번에 요약
+        fold = len(verbatim) - self.keep_recent if len(verbatim) > self.keep_recent + self.fold_batch else 0
+        tokens = estimate_tokens(self.state["summary"]) + sum(estimate_tokens(m["content"]) for m in verbatim[fold:])
+        # 토큰 예산을 넘으면 최소 2개(직전 문답)만 남을 때까지 추가로 요약
+        while tokens > self.token_budget and fold < len(verbatim) - 2:
+            tokens -= estimate_tokens(verbatim[fold]["content"])
+            fold += 1
+        if fold == 0:
+            return
+
+        folded_text = "\n\n".join(f"{_role_name(m)}: {m['content']}" for m in verbatim[:fold])
+        summary_prompt = f"""
+아래는 보드게임 룰 설계 대화의 [기존 요약]과 그 뒤에 이어진 [추가 대화]입니다.
+두 내용을 합쳐 하나의 갱신된 요약을 작성하세요.
+- 확정되었거나 논의된 규칙(인원, 직업과 능력, 턴 구조, 승리 조건, 특수 룰)은 수치와 조건까지 빠짐없이 보존하세요.
+- 사용자가 거절하거나 변경한 안은 최종 결정만 남기세요.
+- 인사말이나 중복된 설명은 생략하고 개조식으로 간결하게 작성하세요.
+
+[기존 요약]
+{self.state["summary"] or "(없음)"}
+
+[추가 대화]
+{folded_text}
+"""
+        try:
+            self.state["summary"] = _generate_text(summary_prompt, feature="chat_summary").strip()
+            self.state["summarized_count"] += fold
+        except Exception:
+            # 요약에 실패하면 이번 턴은 원문을 그대로 보내고 다음 턴에 다시 시도
+            pass
+
+    def render_history(self, history):
+        """요약본 + 원문 메시지로 [이전 대화 기록] 구간의 텍스트 생성"""
+        parts = []
+        if self.state["summary"]:
+            parts.append(f"(이전 대화 요약)\n{self.state['summary']}")
+        parts.extend(f"{_role_name(m)}: {m['content']}" for m in self._verbatim(history))
+        return "\n\n".join(parts)
+
+def _build_chat_transcript(messages_history, context_state, header, closing, default_message):
+    """시스템 지시 + (요약된) 이전 대화 + 새 입력을 하나의 프롬프트로 병합"""
+    history = messages_history[:-1] # 마지막 질문 제외
+    if context_state is not None:
+        context = RollingChatContext(context_state)
+        context.update(history)
+        history_text = context.render_history(history)
+    else:
+        history_text = "\n\n".join(f"{_role_name(m)}: {m['content']}" for m in history)
+
+    last_message = messages_history[-1]["content"] if messages_history else default_message
+    transcript = f"[{header}]\n{SYSTEM_PROMPT}\n\n[이전 대화 기록]\n{history_text}\n\n사용자: {last_message}\n\n{closing}"
+    if context_state is not None:
+        context_state["last_prompt_tokens"] = estimate_tokens(transcript)
+    return transcript
+
+def get_chat_response(messages_history, context_state=None):
+    """ Streamlit의 session_state.messages 구조를 받아서 Gemini 응답 생성
+
+    context_state(new_chat_context()로 만든 dict)를 넘기면 오래된 대화는 롤링 요약으로 대체됩니다.
+    """
     try:
         # 다중 턴(Multi-turn) 오류를 원천 차단하기 위해 모든 대화 내역을 하나의 프롬프트(텍스트)로 병합합니다.
-        transcript = f"[시스템 페르소나 지시사항]\n{SYSTEM_PROMPT}\n\n[이전 대화 기록]\n"
-        for msg in messages_history[:-1]: # 마지막 질문 제외
-            role_name = "게임 마스터" if msg["role"] == "assistant" or msg["role"] == "model" else "사용자"
-            transcript += f"{role_name}의 말: {msg['content']}\n\n"
-            
-        last_message = messages_history[-1]["content"] if messages_history else "대화를 시작합니다."
-        transcript += f"[현재 사용자의 새로운 입력]\n사용자의 말: {last_message}\n\n자 이제 게임 마스터로서 답변을 작성해주세요:"
-        
-        response = model.generate_content(transcript)
-        return response.text
+        transcript = _build_chat_transcript(
+            messages_history, context_state, "시스템 페르소나 지시사항",
+            "자 이제 게임 마스터로서 답변을 작성해주세요:", "대화를 시작합니다."
+        )
+        return _generate_text(transcript, feature="get_chat_response")
     except Exception as e:
         return f"API 호출 에러: {str(e)}"
 
-def stream_chat_response(messages_history):
+def stream_chat_response(messages_history, context_state=None):
     """ Streamlit 실시간 타이핑 효과를 위한 Generator 함수 """
-    if not API_KEY:
+    if not get_backend().configured:
         yield "\n[서버 에러: GEMINI_API_KEY가 정상적으로 로드되지 않았습니다. Streamlit Secrets 설정에 키가 제대로 입력되었는지 확인 후 앱을 재부팅(Reboot) 해주세요.]"
         return
         
     try:
         # 다중 턴 제약을 우회하고 모든 모델에서 지원할 수 있도록 단일 프롬프트로 병합
-        transcript = f"[시스템 지시사항]\n{SYSTEM_PROMPT}\n\n[이전 대화 기록]\n"
-        for msg in messages_history[:-1]:
-            role_name = "게임 마스터" if msg["role"] == "assistant" or msg["role"] == "model" else "사용자"
-            transcript += f"{role_name}: {msg['content']}\n\n"
-            
-        last_message = messages_history[-1]["content"] if messages_history else "대화를 시작해줘."
-        transcript += f"사용자: {last_message}\n\n게임 마스터로서 위 내용에 이어질 답변을 스트리밍으로 작성해주세요:"
-        
+        transcript = _build_chat_transcript(
+            messages_history, context_state, "시스템 지시사항",
+            "게임 마스터로서 위 내용에 이어질 답변을 스트리밍으로 작성해주세요:", "대화를 시작해줘."
+        )
         # 모델명과 관계없이 확실하게 동작하는 generate_content의 단발성 호출 기능 사용
-        response = model.generate_content(transcript, stream=True)
-        # stream 응답 처리
-        for chunk in response:
-            if chunk.text:
-                yield chunk.text
+        yield from _stream_text(transcript, feature="stream_chat_response")
     except Exception as e:
         yield f"\n[서버 통신 오류가 발생했습니다. 잠시 후 룰 조율을 다시 시도해주세요]\n상세 에러: {str(e)}"
 
 def stream_generate_content(prompt):
     """ 규칙 요약 등 단발성 메시지의 실시간 스트리밍을 위한 Generator """
     try:
-        response = model.generate_content(prompt, stream=True)
-        for chunk in response:
-            if chunk.text:
-                yield chunk.text
+        yield from _stream_text(prompt, feature="stream_generate_content")
     except Exception as e:
         yield f"\n[서버 통신 오류가 발생했습니다. 잠시 후 시도해주세요]\n상세 에러: {str(e)}"
 
-def extract_current_rules(messages_history):
-    """현재까지의 대화를 바탕으로 실시간 룰 현황 요약 작성"""
-    if not API_KEY:
-        return "[오류: API 키 설정 안 됨]"
-        
+RULE_STATUS_TEMPLATE = """    - **플레이어 수**: 
+    - **직업 및 역할**: 
+    - **게임 진행 순서/흐름**: 
+    - **승리 조건**: 
+    - **기타 특수 룰**: """
+
+def _extract_rules(messages_history, previous_status=None):
+    """룰 현황 추출 본체 (오류는 호출한 쪽에서 처리하도록 그대로 전달)
+
+    previous_status가 있으면 messages_history는 그 이후에 새로 오간 메시지만 담고 있어야 합니다.
+    """
     history_text = "\n".join([f"{msg['role']}: {msg['content']}" for msg in messages_history[-10:]]) # 최근 10개 대화만
-    prompt = f"""
+    if previous_status:
+        prompt = f"""
+    아래는 게임 룰 설계 대화에서 지금까지 정리된 [기존 룰 현황]과, 그 이후에 새로 오간 [새 대화]입니다.
+    [기존 룰 현황]
+    {previous_status}
+
+    [새 대화]
+    {history_text}
+    
+    [새 대화]에서 확정되거나 바뀐 내용만 [기존 룰 현황]에 반영해 같은 항목 양식의 마크다운으로 다시 작성하세요.
+    새 대화에서 언급되지 않은 항목은 기존 내용을 그대로 유지하세요. 절대 임의로 상상해서 채우지 마세요.
+{RULE_STATUS_TEMPLATE}
+    """
+    else:
+        prompt = f"""
     아래는 사용자와 게임 마스터 간의 게임 룰 설계 대화입니다:
     {history_text}
     
     이 대화를 바탕으로 지금까지 확정되었거나 논의 중인 게임 룰을 추출해 아래 항목별로 마크다운을 써서 간략히 요약하세요.
     아직 논의되지 않은 항목은 '미정'이라고 표시하세요. 절대 임의로 상상해서 채우지 마세요.
-    - **플레이어 수**: 
-    - **직업 및 역할**: 
-    - **게임 진행 순서/흐름**: 
-    - **승리 조건**: 
-    - **기타 특수 룰**: 
+{RULE_STATUS_TEMPLATE}
     """
+    return _generate_text(prompt, feature="extract_current_rules")
+
+def extract_current_rules(messages_history, previous_status=None):
+    """현재까지의 대화를 바탕으로 실시간 룰 현황 요약 작성
+
+    previous_status를 넘기면 이전 현황에 새 메시지(messages_history)만 반영하는 점진적 갱신을 수행합니다.
+    """
+    if not get_backend().configured:
+        return "[오류: API 키 설정 안 됨]"
     try:
         # 단발성 호출. API 지연 등의 무한 대기(Hanging) 방지를 위해 타임아웃/예외처리
-        response = model.generate_content(prompt)
-        return response.text
+        return _extract_rules(messages_history, previous_status)
     except Exception as e:
         return f"현재 대화를 요약하는 중 오류가 발생했습니다: {str(e)}"
 
-def stream_simulation_match(rules_text):
-    """실시간 스트리밍으로 1회의 게임 시뮬레이션을 작동시키고 결과를 반환"""
-    sim_prompt = f"""
+# 룰과 관련된 대화인지 판별하기 위한 키워드 (짧은 동의/거절도 직전 제안에 대한 결정으로 간주)
+# 여러 글자로 된 룰 용어는 메시지 어디에 있어도 룰 관련으로 판단
+RULE_KEYWORDS = (
+    "인원", "플레이어", "참가", "직업", "역할", "능력", "시민", "마피아", "의사", "경찰",
+    "승리", "패배", "조건", "라운드", "투표", "처형", "살해", "생존", "탈락",
+    "규칙", "추가", "삭제", "변경", "바꿔", "정하", "확정", "넣",
+)
+# 한 글자 룰 용어는 단어의 첫머리에 올 때만 (예: "밤에", "팀은", "다섯 명")
+RULE_WORD_PREFIXES = ("명", "팀", "밤", "낮", "턴", "룰", "빼")
+# 짧은 동의/거절 답변은 한 단어 전체가 일치할 때만 ("좋은 생각이네요", "I know"는 제외)
+AGREEMENT_WORDS = frozenset((
+    "네", "넵", "예", "응", "좋아", "좋아요", "좋습니다", "그래", "그래요", "아니", "아니요", "아뇨", "싫어", "싫어요",
+    "ok", "okay", "yes", "no",
+))
+_WORD_PATTERN = re.compile(r"\w+")
+
+def is_rule_related(text):
+    """LLM 호출 없이 메시지가 룰을 건드렸는지 대략 판별 (숫자, 룰 용어, 짧은 동의/거절 답변 포함 여부)"""
+    lowered = text.lower()
+    if any(ch.isdigit() for ch in lowered) or any(keyword in lowered for keyword in RULE_KEYWORDS):
+        return True
+    words = _WORD_PATTERN.findall(lowered)
+    return any(word in AGREEMENT_WORDS or word.startswith(RULE_WORD_PREFIXES) for word in words)
+
+_background_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="llm-background")
+
+class BackgroundRuleExtractor:
+    """룰 현황 추출을 채팅 응답 이후 백그라운드에서 수행하는 세션별 작업 관리자
+
+    - 디바운스: 요청 후 debounce_seconds 동안 새 요청이 오면 이전 요청은 호출 없이 폐기
+    - 점진적 갱신: 마지막으로 반영된 현황 + 그 이후의 메시지만 모델에 전달
+    - 변화 없음: 추출 결과가 기존 현황과 같으면 poll()이 현황을 바꾸지 않음
+    """
+
+    def __init__(self, debounce_seconds=1.0):
+        self.debounce_seconds = debounce_seconds
+        self.status = None        # 마지막으로 반영된 룰 현황
+        self.covered_count = 0    # status에 반영된 메시지 수
+        self.error = None
+        self._generation = 0
+        self._future = None
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self):
+        return self._future is not None
+
+    def reset(self, status=None, covered_count=0):
+        with self._lock:
+            self._generation += 1
+            self._future = None
+            self.status = status
+            self.covered_count = covered_count
+            self.error = None
+
+    def submit(self, messages_history):
+        """새 메시지까지 포함해 현황 갱신을 예약. 새 턴이 룰과 무관하면 False를 반환하고 건너뜀
+
+        건너뛴 메시지는 '반영 완료'로 처리하지 않으므로, 다음에 룰 관련 턴이 오면 함께 모델에 전달됩니다.
+        """
+        new_messages = messages_history[self.covered_count:]
+        # 사용자 메시지뿐 아니라 게임 마스터의 답변(제안 확정, 역할 추가 안내 등)도 함께 확인
+        if not any(is_rule_related(m["content"]) for m in new_messages):
+            return False
+
+        snapshot = list(messages_history)
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+            previous_status, since = self.status, self.covered_count
+            self._future = _background_executor.submit(bind_metrics_session(self._run), generation, snapshot, previous_status, since)
+        return True
+
+    def _run(self, generation, snapshot, previous_status, since):
+        time.sleep(self.debounce_seconds)
+        if generation != self._generation:
+            return None # 더 최신 요청이 들어와 폐기
+        new_messages = snapshot[since:] if previous_status else snapshot
+        return generation, len(snapshot), _extract_rules(new_messages, previous_status)
+
+    def poll(self):
+        """백그라운드 작업이 끝났다면 결과를 반영. 현황이 바뀌었으면 True"""
+        with self._lock:
+            future = self._future
+            if future is None or not future.done():
+                return False
+            self._future = None
+            try:
+                result = future.result()
+            except Exception as e:
+                self.error = f"현재 대화를 요약하는 중 오류가 발생했습니다: {str(e)}"
+                return False
+            if result is None or result[0] != self._generation:
+                return False
+            _, covered_count, new_status = result
+            self.error = None
+            self.covered_count = covered_count
+            if new_status.strip() == (self.status or "").strip():
+                return False
+            self.status = new_status
+            return True
+
+def _create_remote_context(model_name, text, ttl_seconds):
+    """백엔드의 서버 측 캐시(Gemini CachedContent 등)에 공유 앞부분을 올림. 미지원이면 NotImplementedError"""
+    with call_metrics.track("create_rulebook_context", len(text), estimate_tokens(text)):
+        return scheduler.call(lambda: get_backend().create_cached_context(text, ttl_seconds), PRIORITY_BATCH,
+                              estimate_tokens(text))
+
+def _delete_remote_context(remote):
+    get_backend().delete_cached_context(remote)
+
+# 룰북 컨텍스트 캐시: 확정된 룰북 + 시뮬레이터 지시문을 한 번만 등록하고 매 판에는 짧은 요청만 전송
+# GEMINI_CONTEXT_CACHE=0 이면 서버 측 캐시를 쓰지 않고 로컬 대체 모드(매번 전체 프롬프트 전송)로만 동작합니다.
+# 서버 측 캐시는 최소 토큰 수 제한이 있어, 그보다 짧은 룰북은 생성 요청 없이 바로 로컬 대체 모드를 사용합니다.
+context_cache = ContextCache(
+    create_remote=_create_remote_context if os.getenv("GEMINI_CONTEXT_CACHE", "1") != "0" else None,
+    delete_remote=_delete_remote_context,
+    ttl_seconds=int(os.getenv("GEMINI_CONTEXT_CACHE_TTL", str(60 * 60))),
+    min_tokens=int(os.getenv("GEMINI_CONTEXT_CACHE_MIN_TOKENS", "1024")),
+    estimate_tokens=estimate_tokens,
+)
+
+def _simulator_prefix(rules_text):
+    return f"""
 너는 뛰어난 보드게임 플레이 인공지능이자 환경 시뮬레이터야.
-주어진 규칙을 완벽하고 엄격하게 지켜서 처음부터 끝까지 1판의 게임을 가상으로 시뮬레이션 해.
+주어진 규칙을 완벽하고 엄격하게 지켜서 게임을 처음부터 끝까지 가상으로 시뮬레이션 해.
 게임 참가자 플레이어들은 서로를 이기기 위해 각자의 역할에서 최선의 전략적 판단과 논리적 추론, 심리전(거짓말)을 사용해.
-
-가상 플레이어들(가령 플레이어 1~5)이 진행하는 대화와 턴(낮/밤 등)을 생동감있게 요약해서 서술해줘.
 절대 룰에 없는 임의적인 요소를 추가하면 안 되며, 누군가의 승리/패배 조건이 만족되면 즉시 게임을 종료해.
 
 [게임 규칙]
 {rules_text}
+"""
+
+def rulebook_context(rules_text):
+    """확정된 룰북 + 시뮬레이터 지시문을 공유 앞부분으로 등록 (같은 룰북이면 기존 등록을 재사용)"""
+    return context_cache.register(get_model_name(), _simulator_prefix(rules_text))
+
+def invalidate_rulebook_context(rules_text):
+    """룰북이 다시 확정되거나 교체되면 교체되는 그 룰북의 공유 앞부분(서버 측 캐시 포함)만 폐기
+
+    같은 프로세스를 공유하는 다른 테스터의 룰북 컨텍스트는 그대로 둡니다.
+    """
+    if rules_text:
+        context_cache.discard(get_model_name(), _simulator_prefix(rules_text))
+
+# 시뮬레이션 1판의 한도 (출력 토큰은 서버에서도 max_output_tokens로 강제)
+SIM_MAX_OUTPUT_TOKENS = int(os.getenv("SIM_MAX_OUTPUT_TOKENS", "4096"))
+SIM_MAX_SECONDS = float(os.getenv("SIM_MAX_SECONDS", "180"))
+SIM_MAX_TURNS = int(os.getenv("SIM_MAX_TURNS", "20"))
+# 배치 모드는 K판을 한 응답에 받으므로 판당 한도 × K를 쓰되, 모델의 최대 출력 길이를 넘지 않도록 제한
+SIM_BATCH_MAX_OUTPUT_TOKENS = int(os.getenv("SIM_BATCH_MAX_OUTPUT_TOKENS", "8192"))
+
+def new_match_monitor():
+    """시뮬레이션 1판용 스트리밍 감시기 (위 한도 설정을 적용)"""
+    return MatchStreamMonitor(max_output_tokens=SIM_MAX_OUTPUT_TOKENS, max_seconds=SIM_MAX_SECONDS,
+                              max_turns=SIM_MAX_TURNS, estimate_tokens=estimate_tokens)
+
+def stream_simulation_match(rules_text, use_cache=False, usage=None, monitor=None):
+    """실시간 스트리밍으로 1회의 게임 시뮬레이션을 작동시키고 결과를 반환
+
+    시뮬레이션은 매 판 새로운 표본이 필요하므로 기본적으로 캐시를 우회합니다.
+    (use_cache=True 이면 같은 규칙의 이전 결과를 재생)
+    usage(dict)를 넘기면 이 판에서 사용한 토큰 수가 채워집니다.
+    monitor(MatchStreamMonitor)를 넘기면 결과 요약 블록을 다 받은 즉시, 또는 한도를 넘으면 스트림을 닫습니다.
+    (중단 이유는 monitor.abort_reason에 남음) 시간 한도는 스케줄러 슬롯을 얻은 뒤부터 재시도까지 합쳐 재며,
+    청크가 오지 않고 멈춘 스트림도 같은 한도를 요청 기한으로 넘겨 끊습니다.
+    """
+    sim_prompt = f"""
+[요청]
+위 규칙대로 1판의 게임을 시뮬레이션 해.
+가상 플레이어들(가령 플레이어 1~5)이 진행하는 대화와 턴(낮/밤 등)을 생동감있게 요약해서 서술해줘.
+{SIM_MAX_TURNS}번째 낮/밤 사이클이 끝날 때까지 승부가 나지 않으면 승리팀을 '무승부'로 하고 바로 결과를 요약해.
 
 ***매우 중요***
 시뮬레이션이 끝난 후, 출력의 제일 마지막에 반드시 아래와 같은 포맷으로 결과를 요약해. 프로그램이 파싱할 거니까 양식을 꼭 지켜:
 ===결과 요약===
 승리팀: [예: 시민팀 또는 마피아팀 등]
+승리역할: [승리팀에 속한 역할을 쉼표로 구분, 예: 의사, 경찰, 시민]
 생존역할: [예: 의사, 시민, 마피아 등]
 주요승인: [문장으로 짧게 요약]
+진행턴수: [게임이 끝날 때까지 진행된 낮/밤 사이클 수, 숫자만]
 """
     try:
-        response = model.generate_content(sim_prompt, stream=True)
-        for chunk in response:
-            if chunk.text:
-                yield chunk.text
+        context = rulebook_context(rules_text)
+        for chunk in _stream_text(sim_prompt, generation_config={"max_output_tokens": SIM_MAX_OUTPUT_TOKENS},
+                                  use_cache=use_cache, usage=usage, priority=PRIORITY_BATCH, context=context,
+                                  feature="stream_simulation_match", timeout=SIM_MAX_SECONDS,
+                                  on_start=monitor.start if monitor is not None else None):
+            yield chunk
+            if monitor is not None and monitor.feed(chunk):
+                break # 결과 요약을 다 받았거나 한도를 넘었으면 남은 출력을 기다리지 않고 스트림을 닫음
     except Exception as e:
+        if monitor is not None and is_timeout_error(e):
+            monitor.abort_reason = "time_budget"
+            return
         yield f"===결과 요약===\n승리팀: 에러발생\n생존역할: 없음\n주요승인: {str(e)}"
 
-def stream_analyze_simulation_results(rules_text, simulation_logs):
-    """여러 판 진행된 시뮬레이션 로그를 바탕으로 실시간 스트리밍 분석"""
-    analyze_prompt = f"""
-너는 천재적인 보드게임 밸런스 기획자야.
-아래는 사용자가 만든 게임의 [규칙]과, 이 규칙대로 AI들이 여러번 테스트플레이한 [종합 결과 로그]야.
+# 배치 시뮬레이션 응답 스키마 (한 번의 호출로 K판을 JSON 배열로 받음)
+SIMULATION_BATCH_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "narrative": {"type": "string"},
+            "winning_team": {"type": "string"},
+            "winning_roles": {"type": "array", "items": {"type": "string"}},
+            "surviving_roles": {"type": "array", "items": {"type": "string"}},
+            "key_reason": {"type": "string"},
+            "turn_count": {"type": "integer"},
+        },
+        "required": ["narrative", "winning_team", "winning_roles", "surviving_roles", "key_reason", "turn_count"],
+    },
+}
+
+def _parse_json_array(text):
+    """JSON 배열을 파싱. 출력이 도중에 잘렸으면 끝까지 완성된 원소들만 복구"""
+    try:
+        value = json.loads(text)
+        return value if isinstance(value, list) else [value]
+    except ValueError:
+        pass
+    decoder = json.JSONDecoder()
+    items = []
+    position = text.find("[") + 1
+    while 0 < position < len(text):
+        while position < len(text) and text[position] in " \r\n\t,":
+            position += 1
+        try:
+            item, position = decoder.raw_decode(text, position)
+        except ValueError:
+            break
+        items.append(item)
+    return items
+
+def generate_simulation_batch(rules_text, num_games, use_cache=False, stop_event=None, max_retries=2):
+    """한 번의 요청으로 서로 독립적인 num_games판을 시뮬레이션해 match_stats 레코드 리스트로 반환
+
+    규칙과 지시문을 판마다 다시 보내지 않아 입력 토큰과 요청당 오버헤드를 줄입니다.
+    형식이 맞지 않는 판만 모아서 그 수만큼 다시 요청하며, max_retries번 뒤에도 실패한 판은
+    parsed=False 레코드로 채웁니다. stop_event가 설정되면 None을 반환합니다.
+    전체 소요 시간은 판당 SIM_MAX_SECONDS × num_games로 제한하며, 시간 안에 받지 못한 판은
+    abort_reason="time_budget"으로 기록합니다. 시간은 처음 스케줄러 슬롯을 얻은 뒤부터 재고(대기열 시간 제외),
+    각 요청에는 남은 시간을 요청 기한으로 넘겨 멈춘 스트림도 끊습니다.
+    """
+    records = []
+    deadline = None
+
+    def _start_clock():
+        nonlocal deadline
+        if deadline is None:
+            deadline = time.monotonic() + SIM_MAX_SECONDS * num_games
+
+    def _time_left():
+        return SIM_MAX_SECONDS * num_games if deadline is None else deadline - time.monotonic()
+
+    for attempt in range(max_retries + 1):
+        missing = num_games - len(records)
+        if missing <= 0 or _time_left() <= 0:
+            break
+        batch_prompt = f"""
+[요청]
+위 규칙대로 서로 완전히 독립적인 게임 {missing}판을 시뮬레이션 해.
+판마다 역할 배정, 플레이어들의 전략과 심리전, 사건 전개가 달라야 하며 앞 판의 결과가 다음 판에 영향을 주면 안 돼.
+{SIM_MAX_TURNS}번째 낮/밤 사이클이 끝날 때까지 승부가 나지 않은 판은 승리팀을 '무승부'로 하고 그 판을 끝내.
+
+출력은 정확히 {missing}개의 원소를 가진 JSON 배열이어야 하며, 각 원소는 한 판의 결과야:
+- narrative: 가상 플레이어들의 대화와 낮/밤 턴 진행을 생동감 있게 요약한 서술
+- winning_team: 승리팀 이름
+- winning_roles: 승리팀에 속한 역할 목록
+- surviving_roles: 게임 종료 시 생존한 역할 목록
+- key_reason: 주요 승인을 짧은 문장으로
+- turn_count: 게임이 끝날 때까지 진행된 낮/밤 사이클 수
+"""
+        usage = {}
+        chunks = []
+        try:
+            context = rulebook_context(rules_text)
+            generation_config = {
+                "response_mime_type": "application/json",
+                "response_schema": SIMULATION_BATCH_SCHEMA,
+                "max_output_tokens": min(SIM_MAX_OUTPUT_TOKENS * missing, SIM_BATCH_MAX_OUTPUT_TOKENS),
+            }
+            for chunk in _stream_text(batch_prompt, context=context, generation_config=generation_config,
+                                      use_cache=use_cache and attempt == 0, usage=usage, priority=PRIORITY_BATCH,
+                                      feature="generate_simulation_batch", timeout=_time_left(), on_start=_start_clock):
+                if stop_event is not None and stop_event.is_set():
+                    return None
+                chunks.append(chunk)
+                if _time_left() <= 0:
+                    break # 시간 한도를 넘기면 지금까지 완성된 판만 사용
+        except Exception as e:
+            # 요청 기한으로 끊겼으면 재시도하지 않고 지금까지 완성된 판만 사용
+            if not (is_timeout_error(e) and chunks):
+                if attempt >= max_retries:
+                    break
+                continue
+
+        games = _parse_json_array("".join(chunks))[:missing]
+        # 토큰 사용량은 이번 호출에서 받은 판 수로 나누어 판별로 기록
+        share = {key: value // max(1, len(games)) for key, value in usage.items()}
+        for game in games:
+            try:
+                records.append(record_from_game_json(game, usage=share))
+            except (ValueError, TypeError):
+                continue # 형식이 맞지 않는 판은 다음 시도에서 다시 생성
+
+    failed = num_games - len(records)
+    for _ in range(failed):
+        record = parse_match_result("[배치 시뮬레이션 결과를 읽지 못했습니다]")
+        record["abort_reason"] = "time_budget" if _time_left() <= 0 else None
+        records.append(record)
+    return records
+
+def run_simulation_matches(rules_text, num_games, max_concurrency=4, stop_event=None, use_cache=False, games_per_call=1):
+    """여러 판의 시뮬레이션을 동시에(최대 max_concurrency판) 진행하는 Generator
+
+    각 판의 스트리밍 청크를 도착하는 순서대로 (판 번호, 종류, 값) 형태로 전달합니다.
+    - ("chunk", 텍스트): 해당 판의 새 청크
+    - ("done", 레코드): 해당 판의 시뮬레이션 종료. 레코드는 match_stats.parse_match_result 결과이며
+      중단된 판은 None (턴/토큰/시간 한도로 끊긴 판은 레코드의 abort_reason에 이유가 기록됨)
+    stop_event가 설정되면 진행 중인 판은 다음 청크에서 멈추고 새 판은 시작하지 않습니다.
+    use_cache=False(기본값)이면 응답 캐시를 우회해 매 판 새로운 결과를 생성합니다.
+    games_per_call>1이면 한 번의 호출로 여러 판을 JSON으로 받는 배치 모드로 진행하며,
+    이때는 판별 청크 없이 호출 단위로 "done" 이벤트만 전달됩니다.
+    """
+    if num_games <= 0:
+        return
+    stop_event = stop_event or threading.Event()
+    events = queue.Queue()
+
+    def _play(index):
+        if stop_event.is_set():
+            events.put((index, "done", None))
+            return
+        parts = []
+        usage = {}
+        monitor = new_match_monitor()
+        try:
+            for chunk in stream_simulation_match(rules_text, use_cache=use_cache, usage=usage, monitor=monitor):
+                if stop_event.is_set():
+                    break
+                parts.append(chunk)
+                events.put((index, "chunk", chunk))
+        finally:
+            # 중단된 판은 결과 레코드 대신 None을 전달
+            record = None if stop_event.is_set() else parse_match_result("".join(parts), usage=usage)
+            if record is not None:
+                record["abort_reason"] = monitor.finish(usage.get("output_tokens"))
+            events.put((index, "done", record))
+
+    def _play_batch(indices):
+        records = None
+        try:
+            if not stop_event.is_set():
+                records = generate_simulation_batch(rules_text, len(indices), use_cache=use_cache, stop_event=stop_event)
+        finally:
+            for offset, index in enumerate(indices):
+                events.put((index, "done", records[offset] if records else None))
+
+    games_per_call = max(1, games_per_call)
+    batches = [list(range(start, min(start + games_per_call, num_games))) for start in range(0, num_games, games_per_call)]
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(batches))))
+    try:
+        for indices in batches:
+            # 작업 스레드의 세션 ID를 각 판의 호출 기록에 이어 붙임
+            if games_per_call == 1:
+                executor.submit(bind_metrics_session(_play), indices[0])
+            else:
+                executor.submit(bind_metrics_session(_play_batch), indices)
+        finished = 0
+        while finished < num_games:
+            index, kind, text = events.get()
+            if kind == "done":
+                finished += 1
+            yield index, kind, text
+    finally:
+        # 소비 측이 도중에 멈추더라도 남은 작업이 계속 API를 호출하지 않도록 정리
+        stop_event.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def compile_game_spec(rules_text):
+    """확정된 룰북을 수학적 시뮬레이션 엔진(core.monte_carlo)용 JSON 게임 명세로 한 번 변환
+
+    같은 룰북이면 응답 캐시에서 그대로 재사용합니다. 형식 오류는 호출한 쪽에서 처리하도록 예외로 전달하며,
+    이때 캐시된 응답은 지워 다음 요청에서 새로 변환합니다.
+    """
+    spec_prompt = f"""
+아래 [게임 규칙]을 컴퓨터 시뮬레이터가 읽을 수 있는 JSON 게임 명세로 변환해.
+규칙에 없는 내용을 상상해서 추가하지 말고, 시뮬레이터가 지원하지 않는 세부 능력은 가장 가까운 행동으로 단순화해.
+
+JSON 형식:
+{{
+  "title": "게임 제목",
+  "roles": [
+    {{"name": "역할 이름", "team": "소속 팀 이름", "count": 인원수(정수),
+      "night_action": "kill | protect | investigate | none 중 하나", "vote_weight": 낮 투표 가중치(기본 1)}}
+  ],
+  "teams": [
+    {{"name": "팀 이름", "win_condition": "eliminate_others(다른 팀 전멸) | parity(생존 인원이 나머지 이상) 중 하나"}}
+  ],
+  "day_vote": 낮에 투표로 1명을 처형하는지 여부(true/false),
+  "max_days": 게임이 끝나지 않을 때 무승부로 처리할 최대 일수(정수)
+}}
+
+[게임 규칙]
+{rules_text}
+"""
+    generation_config = {"response_mime_type": "application/json", "temperature": 0}
+    text = _generate_text(spec_prompt, generation_config=generation_config, priority=PRIORITY_NORMAL, feature="compile_game_spec")
+    try:
+        return validate_game_spec(json.loads(text))
+    except (ValueError, TypeError):
+        # 파싱/검증에 실패한 응답이 캐시에 남아 같은 오류가 반복되지 않도록 삭제
+        response_cache.discard(make_cache_key(get_model_name(), spec_prompt, generation_config))
+        raise
+
+def generate_rule_variant(rules_text, change):
+    """확정된 룰북에 변경 사항 1건(플레이어 수, 역할 인원, 특수 규칙 켜기/끄기 등)만 반영한 변형 룰북 생성
+
+    같은 (룰북, 변경 사항)이면 응답 캐시에서 그대로 재사용합니다. 오류는 호출한 쪽에서 처리하도록 예외로 전달합니다.
+    """
+    variant_prompt = f"""
+아래 [게임 규칙]에 [변경 사항]만 반영한 새 룰북을 작성해.
+변경 사항과 직접 관련된 부분(인원 구성, 역할 수, 승리 조건의 숫자 등)만 일관되게 고치고, 나머지 문장과 양식은 그대로 유지해.
+설명이나 인사말 없이 완성된 룰북 본문만 출력해.
+
+[변경 사항]
+{change}
 
 [게임 규칙]
 {rules_text}
+"""
+    return _generate_text(variant_prompt, generation_config={"temperature": 0}, priority=PRIORITY_NORMAL,
+                          feature="generate_rule_variant").strip()
+
+def stream_analyze_simulation_results(rules_text, simulation_digest):
+    """여러 판 진행된 시뮬레이션의 집계 결과를 바탕으로 실시간 스트리밍 분석
+
+    simulation_digest는 match_stats.build_analysis_digest로 만든 승률 집계 + 대표 로그 몇 개입니다.
+    (판 수가 늘어나도 프롬프트 크기가 일정하게 유지됨)
+    """
+    analyze_prompt = f"""
+[요청]
+이번에는 시뮬레이터가 아니라 천재적인 보드게임 밸런스 기획자로서 답해.
+아래는 위 규칙대로 AI들이 여러번 테스트플레이한 결과를 프로그램이 집계한 [통계]와 [대표 경기 로그]야.
 
-[시뮬레이션 종합 결과 로그]
-{simulation_logs}
+[시뮬레이션 종합 통계 및 대표 로그]
+{simulation_digest}
 
-로그를 유심히 분석하여 다음 정보들을 깔끔한 마크다운 양식으로 보고해줘:
+통계와 로그를 유심히 분석하여 다음 정보들을 깔끔한 마크다운 양식으로 보고해줘:
 1. 롤별 승률 분석 및 전체적인 게임 밸런스 평가
 2. 필승법(Abuse) 가능성이 존재하는지 논리적 분석
 3. 게임을 더 구조적이고 재미있게(혹은 밸런스 있게) 바꾸기 위한 추천 룰 개선안
 """
     try:
-        response = model.generate_content(analyze_prompt, stream=True)
-        for chunk in response:
-            if chunk.text:
-                yield chunk.text
+        # 시뮬레이션 때 등록한 룰북 앞부분을 그대로 재사용
+        yield from _stream_text(analyze_prompt, priority=PRIORITY_NORMAL, context=rulebook_context(rules_text),
+                                feature="stream_analyze_simulation_results")
     except Exception as e:
         yield f"분석 중 에러가 발생했습니다: {str(e)}"
@@ -0,0 +1,388 @@
+import math
+import re
+import time
+
+import pandas as pd
+
+# stream_simulation_match 프롬프트가 요구하는 결과 블록 양식
+RESULT_MARKER = "===결과 요약==="
+RESULT_FIELDS = {
+    "승리팀": "winning_team",
+    "승리역할": "winning_roles",
+    "생존역할": "surviving_roles",
+    "주요승인": "key_reason",
+    "진행턴수": "turn_count",
+}
+
+RESULT_COLUMNS = [
+    "game_no", "winning_team", "winning_roles", "surviving_roles", "key_reason",
+    "turn_count", "prompt_tokens", "output_tokens", "parsed", "abort_reason", "log",
+]
+
+# 스트리밍 감시(MatchStreamMonitor)가 판을 중단한 이유
+ABORT_REASONS = {
+    "token_budget": "출력 토큰 한도 초과",
+    "time_budget": "시간 한도 초과",
+    "turn_limit": "턴 수 한도 초과",
+}
+
+# 결과 블록에 턴 수가 없을 때 본문에서 추정하기 위한 패턴 (예: "3일차", "2번째 밤", "턴 4")
+_TURN_PATTERN = re.compile(r"(\d+)\s*(?:일차|번째\s*(?:밤|낮)|턴|라운드)|(?:턴|라운드|Day|DAY)\s*(\d+)")
+_GAME_HEADER_PATTERN = re.compile(r"^### \[(?:신규 )?게임 (\d+) 요약\]\s*$", re.MULTILINE)
+_ERROR_TEAM = "에러발생"
+
+
+def _split_roles(value):
+    """'의사, 시민, 마피아' 형태의 문자열을 역할 리스트로 변환"""
+    if not value or value.strip() in ("없음", "-", "미정"):
+        return []
+    return [role.strip(" []") for role in re.split(r"[,/·、]", value) if role.strip(" []")]
+
+
+def parse_match_result(text, game_no=None, usage=None):
+    """시뮬레이션 1판의 출력에서 ===결과 요약=== 블록을 읽어 구조화된 레코드로 변환
+
+    블록이 없거나 필드가 빠져 있으면 parsed=False로 표시하고 가능한 값만 채웁니다.
+    """
+    usage = usage or {}
+    record = {
+        "game_no": game_no,
+        "winning_team": None,
+        "winning_roles": [],
+        "surviving_roles": [],
+        "key_reason": None,
+        "turn_count": None,
+        "prompt_tokens": usage.get("prompt_tokens", 0),
+        "output_tokens": usage.get("output_tokens", 0),
+        "parsed": False,
+        "abort_reason": None,
+        "log": text,
+    }
+
+    marker_at = text.rfind(RESULT_MARKER)
+    body, block = (text[:marker_at], text[marker_at + len(RESULT_MARKER):]) if marker_at >= 0 else (text, "")
+    for line in block.splitlines():
+        key, sep, value = line.partition(":")
+        field = RESULT_FIELDS.get(key.strip(" -*[]"))
+        if not sep or field is None:
+            continue
+        value = value.strip().strip("[]").strip()
+        if field in ("winning_roles", "surviving_roles"):
+            record[field] = _split_roles(value)
+        elif field == "turn_count":
+            digits = re.search(r"\d+", value)
+            record[field] = int(digits.group()) if digits else None
+        else:
+            record[field] = value or None
+
+    if record["turn_count"] is None:
+        turns = [int(a or b) for a, b in _TURN_PATTERN.findall(body)]
+        record["turn_count"] = max(turns) if turns else None
+
+    record["parsed"] = bool(record["winning_team"]) and record["winning_team"] != _ERROR_TEAM
+    return record
+
+
+class MatchStreamMonitor:
+    """스트리밍 중인 시뮬레이션 1판의 출력을 청크가 도착할 때마다 검사
+
+    feed()가 True를 반환하면 호출한 쪽에서 스트림을 닫으면 됩니다.
+    - 완전한 ===결과 요약=== 블록(모든 필드 줄이 줄바꿈까지 도착)을 받으면 정상 종료
+    - 출력 토큰(estimate_tokens로 추정), 경과 시간, 본문에 나온 턴 번호가 한도를 넘으면 중단하고
+      abort_reason에 ABORT_REASONS의 키를 기록
+    경과 시간은 start()(스케줄러 슬롯을 얻어 요청을 보낸 시점)부터 재므로 대기열에서 기다린 시간은 포함하지 않습니다.
+    청크가 도착할 때 검사하므로, 청크 없이 멈춘 스트림은 같은 시간 한도를 요청 기한(timeout)으로 넘겨 끊습니다.
+    """
+
+    def __init__(self, max_output_tokens=None, max_seconds=None, max_turns=None, estimate_tokens=None):
+        self.max_output_tokens = max_output_tokens
+        self.max_seconds = max_seconds
+        self.max_turns = max_turns
+        self.estimate_tokens = estimate_tokens
+        self.started = None
+        self.text = ""
+        self.max_turn_seen = 0
+        self.result_complete = False
+        self.abort_reason = None
+        self._scanned = 0
+
+    def _has_complete_result(self):
+        marker_at = self.text.rfind(RESULT_MARKER)
+        if marker_at < 0:
+            return False
+        # 마지막 줄은 아직 다 받지 못했을 수 있으므로(예: 진행턴수 "1" 뒤에 "2"가 올 수 있음) 제외
+        lines = self.text[marker_at + len(RESULT_MARKER):].split("\n")[:-1]
+        found = {key.strip(" -*[]") for key, sep, value in (line.partition(":") for line in lines) if sep and value.strip()}
+        return all(field in found for field in RESULT_FIELDS)
+
+    def _update_turns(self):
+        # 이미 검사한 부분은 숫자가 청크 경계에 걸친 경우만 다시 보도록 조금 겹쳐서 검사
+        start = max(0, self._scanned - 16)
+        marker_at = self.text.find(RESULT_MARKER, start)
+        end = marker_at if marker_at >= 0 else len(self.text)
+        turns = [int(a or b) for a, b in _TURN_PATTERN.findall(self.text[start:end])]
+        if turns:
+            self.max_turn_seen = max(self.max_turn_seen, *turns)
+        self._scanned = end
+
+    def start(self):
+        """요청을 보내는 시점에 호출해 시간 한도 측정을 시작 (재시도하면 그 요청부터 다시 잼)"""
+        self.started = time.monotonic()
+
+    def feed(self, chunk):
+        """청크를 반영하고, 스트림을 더 읽을 필요가 없으면 True"""
+        if self.started is None:
+            self.start()
+        self.text += chunk
+        if self._has_complete_result():
+            self.result_complete = True
+            return True
+        self._update_turns()
+        if self.max_turns and self.max_turn_seen > self.max_turns:
+            self.abort_reason = "turn_limit"
+        elif self.max_seconds and time.monotonic() - self.started > self.max_seconds:
+            self.abort_reason = "time_budget"
+        elif self.max_output_tokens and self.estimate_tokens and self.estimate_tokens(self.text) > self.max_output_tokens:
+            self.abort_reason = "token_budget"
+        return self.abort_reason is not None
+
+    def finish(self, output_tokens=None):
+        """스트림이 끝난 뒤 호출. 결과 블록 없이 서버의 출력 토큰 한도에서 잘린 경우도 중단으로 기록"""
+        if (not self.result_complete and self.abort_reason is None and self.max_output_tokens
+                and output_tokens and output_tokens >= self.max_output_tokens):
+            self.abort_reason = "token_budget"
+        return self.abort_reason
+
+
+def format_result_block(winning_team, winning_roles, surviving_roles, key_reason, turn_count):
+    """구조화된 결과를 스트리밍 시뮬레이션과 같은 ===결과 요약=== 블록 텍스트로 변환"""
+    return "\n".join([
+        RESULT_MARKER,
+        f"승리팀: {winning_team}",
+        f"승리역할: {', '.join(winning_roles) or '없음'}",
+        f"생존역할: {', '.join(surviving_roles) or '없음'}",
+        f"주요승인: {key_reason}",
+        f"진행턴수: {turn_count if turn_count is not None else ''}",
+    ])
+
+
+def record_from_game_json(game, game_no=None, usage=None):
+    """배치 시뮬레이션(JSON 출력)의 게임 1개를 레코드로 변환. 필수 필드가 없으면 ValueError"""
+    if not isinstance(game, dict) or not str(game.get("narrative", "")).strip() or not str(game.get("winning_team", "")).strip():
+        raise ValueError("narrative/winning_team 필드가 없는 게임 결과입니다.")
+
+    def _roles(value):
+        return [str(role).strip() for role in value if str(role).strip()] if isinstance(value, list) else _split_roles(str(value or ""))
+
+    turn_count = game.get("turn_count")
+    log = game["narrative"].strip() + "\n\n" + format_result_block(
+        str(game["winning_team"]).strip(), _roles(game.get("winning_roles")), _roles(game.get("surviving_roles")),
+        str(game.get("key_reason", "")).strip(), int(turn_count) if isinstance(turn_count, (int, float)) else None,
+    )
+    return parse_match_result(log, game_no=game_no, usage=usage)
+
+
+def parse_match_logs(history_text):
+    """예전 백업의 sim_logs_history 문자열("### [게임 N 요약]" 구분)을 레코드 리스트로 변환"""
+    headers = list(_GAME_HEADER_PATTERN.finditer(history_text or ""))
+    records = []
+    for i, header in enumerate(headers):
+        end = headers[i + 1].start() if i + 1 < len(headers) else len(history_text)
+        records.append(parse_match_result(history_text[header.end():end].strip(), game_no=int(header.group(1))))
+    return records
+
+
+def new_results_frame():
+    return pd.DataFrame({column: pd.Series(dtype="object") for column in RESULT_COLUMNS})
+
+
+def append_records(results_df, records):
+    """결과 테이블에 레코드를 추가한 새 DataFrame 반환 (game_no가 없으면 이어지는 번호 부여)"""
+    if not records:
+        return results_df
+    start = int(pd.to_numeric(results_df["game_no"], errors="coerce").max()) if len(results_df) else 0
+    rows = []
+    for offset, record in enumerate(records):
+        row = {column: record.get(column) for column in RESULT_COLUMNS}
+        if row["game_no"] is None:
+            row["game_no"] = start + offset + 1
+        rows.append(row)
+    new_rows = pd.DataFrame(rows, columns=RESULT_COLUMNS)
+    if results_df.empty:
+        return new_rows
+    return pd.concat([results_df, new_rows], ignore_index=True)
+
+
+def results_from_dict(data):
+    if not data:
+        return new_results_frame()
+    results_df = pd.DataFrame(data)
+    for column in RESULT_COLUMNS:
+        if column not in results_df:
+            results_df[column] = None
+    return results_df[RESULT_COLUMNS]
+
+
+def _parsed_rows(results_df):
+    """결과 블록을 정상적으로 읽은 판만 선택"""
+    return results_df[results_df["parsed"].fillna(False).astype(bool)]
+
+
+def wilson_interval(successes, trials, z=1.96):
+    """이항 비율의 Wilson 신뢰구간 (표본이 적거나 0%/100%에 가까워도 안정적)"""
+    if trials == 0:
+        return 0.0, 1.0
+    p = successes / trials
+    denominator = 1 + z * z / trials
+    center = (p + z * z / (2 * trials)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / trials + z * z / (4 * trials * trials)) / denominator
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+def _rate_table(counts, trials, label):
+    rows = []
+    for name, successes in counts.items():
+        low, high = wilson_interval(int(successes), trials)
+        rows.append({label: name, "count": int(successes), "games": trials,
+                     "rate": successes / trials, "ci_low": low, "ci_high": high})
+    return pd.DataFrame(rows, columns=[label, "count", "games", "rate", "ci_low", "ci_high"]).sort_values(
+        "rate", ascending=False, ignore_index=True)
+
+
+def team_win_rates(results_df):
+    """팀별 승률과 95% 신뢰구간 (결과 블록을 읽지 못한 판은 제외)"""
+    valid = _parsed_rows(results_df)
+    return _rate_table(valid["winning_team"].value_counts(), len(valid), "team")
+
+
+def balance_gap(results_df):
+    """가장 많이 이긴 팀의 승률이 50%에서 벗어난 정도(불균형도)와 그 95% 신뢰구간
+
+    gap이 0에 가까울수록 균형 잡힌 규칙입니다. 집계할 판이 없으면 gap은 None이고 구간은 가능한 전체 범위입니다.
+    """
+    teams = team_win_rates(results_df)
+    if teams.empty:
+        return {"games": 0, "top_team": None, "top_rate": None, "ci_low": 0.0, "ci_high": 1.0,
+                "gap": None, "gap_low": 0.0, "gap_high": 0.5}
+    top = teams.iloc[0]
+    distances = (abs(top["ci_low"] - 0.5), abs(top["ci_high"] - 0.5))
+    return {
+        "games": int(top["games"]), "top_team": top["team"], "top_rate": float(top["rate"]),
+        "ci_low": float(top["ci_low"]), "ci_high": float(top["ci_high"]),
+        "gap": abs(float(top["rate"]) - 0.5),
+        # 구간이 50%를 포함하면 완전한 균형일 가능성도 남아 있음
+        "gap_low": 0.0 if top["ci_low"] <= 0.5 <= top["ci_high"] else float(min(distances)),
+        "gap_high": float(max(distances)),
+    }
+
+
+def role_win_rates(results_df):
+    """역할별 승률(해당 역할이 승리한 편에 속한 판의 비율)과 95% 신뢰구간"""
+    valid = _parsed_rows(results_df)
+    return _rate_table(valid["winning_roles"].explode().dropna().value_counts(), len(valid), "role")
+
+
+def role_survival_rates(results_df):
+    valid = _parsed_rows(results_df)
+    return _rate_table(valid["surviving_roles"].explode().dropna().value_counts(), len(valid), "role")
+
+
+def summarize_results(results_df):
+    """대시보드/분석 프롬프트에 쓰이는 집계 요약 dict"""
+    valid = _parsed_rows(results_df)
+    turns = pd.to_numeric(valid["turn_count"], errors="coerce").dropna()
+    return {
+        "games": len(results_df),
+        "parsed_games": len(valid),
+        "avg_turns": float(turns.mean()) if len(turns) else None,
+        "prompt_tokens": int(pd.to_numeric(results_df["prompt_tokens"], errors="coerce").fillna(0).sum()),
+        "output_tokens": int(pd.to_numeric(results_df["output_tokens"], errors="coerce").fillna(0).sum()),
+        "teams": team_win_rates(results_df),
+        "roles": role_win_rates(results_df),
+        "survival": role_survival_rates(results_df),
+    }
+
+
+def representative_logs(results_df, max_samples=3, max_chars=3000):
+    """승리팀마다 중간 길이의 경기 로그를 하나씩 골라 대표 표본으로 사용"""
+    valid = _parsed_rows(results_df)
+    samples = []
+    for _, group in valid.groupby("winning_team", sort=False):
+        lengths = group["log"].fillna("").str.len()
+        median_row = group.loc[(lengths - lengths.median()).abs().idxmin()]
+        samples.append((median_row["game_no"], median_row["log"][:max_chars]))
+        if len(samples) >= max_samples:
+            break
+    return samples
+
+
+def build_analysis_digest(results_df, max_samples=3):
+    """분석 모델에 보낼 집계 결과 + 대표 로그 몇 개 (원본 로그 전체를 보내지 않음)"""
+    summary = summarize_results(results_df)
+    lines = [
+        f"- 총 시뮬레이션: {summary['games']}판 (결과 집계 가능: {summary['parsed_games']}판)",
+        f"- 평균 진행 턴 수: {summary['avg_turns']:.1f}" if summary["avg_turns"] is not None else "- 평균 진행 턴 수: 알 수 없음",
+        "",
+        "[팀별 승률 (95% 신뢰구간)]",
+    ]
+    for row in summary["teams"].itertuples():
+        lines.append(f"- {row.team}: {row.count}승 / {row.games}판 = {row.rate:.0%} ({row.ci_low:.0%}~{row.ci_high:.0%})")
+    lines += ["", "[역할별 승률 (95% 신뢰구간)]"]
+    for row in summary["roles"].itertuples():
+        lines.append(f"- {row.role}: {row.rate:.0%} ({row.ci_low:.0%}~{row.ci_high:.0%})")
+    lines += ["", "[역할별 생존율]"]
+    for row in summary["survival"].itertuples():
+        lines.append(f"- {row.role}: {row.rate:.0%}")
+
+    valid = _parsed_rows(results_df)
+    reasons = valid["key_reason"].dropna().tolist()
+    if reasons:
+        lines += ["", "[판별 주요 승인 (최근 10판)]"] + [f"- {reason}" for reason in reasons[-10:]]
+
+    for game_no, log in representative_logs(results_df, max_samples):
+        lines += ["", f"[대표 경기 로그 - 게임 {game_no}]", log]
+    return "\n".join(lines)
+
+
+def sprt_balance_decision(wins, trials, delta=0.2, alpha=0.05, beta=0.10):
+    """50:50 균형(H0: p=0.5)과 불균형(H1: p=0.5±delta)을 가르는 양측 순차확률비검정(SPRT)
+
+    "balanced" / "imbalanced"로 결론이 나면 반환하고, 아직 판단할 수 없으면 None을 반환합니다.
+    양측 검정이므로 각 방향에 alpha/2를 배분합니다.
+    """
+    if trials == 0:
+        return None
+    losses = trials - wins
+    upper = math.log((1 - beta) / (alpha / 2))
+    lower = math.log(beta / (1 - alpha / 2))
+    llr_high = wins * math.log((0.5 + delta) / 0.5) + losses * math.log((0.5 - delta) / 0.5)
+    llr_low = wins * math.log((0.5 - delta) / 0.5) + losses * math.log((0.5 + delta) / 0.5)
+    if llr_high >= upper or llr_low >= upper:
+        return "imbalanced"
+    if llr_high <= lower and llr_low <= lower:
+        return "balanced"
+    return None
+
+
+def early_stop_reason(results_df, min_games=5, ci_width_target=0.25, sprt_delta=0.2, alpha=0.05, beta=0.10):
+    """지금까지의 결과로 배치를 멈춰도 되는지 판단해 그 이유를 반환 (계속해야 하면 None)
+
+    가장 많이 이긴 팀의 승률을 기준으로
+    1) 95% 신뢰구간 폭이 ci_width_target 이하로 좁혀졌거나
+    2) SPRT가 균형/불균형 중 하나로 결론을 냈으면 멈춥니다.
+    """
+    valid = _parsed_rows(results_df)
+    trials = len(valid)
+    if trials < min_games:
+        return None
+    counts = valid["winning_team"].value_counts()
+    team, wins = counts.index[0], int(counts.iloc[0])
+    low, high = wilson_interval(wins, trials)
+    if high - low <= ci_width_target:
+        return f"{team} 승률 {wins / trials:.0%}의 95% 신뢰구간 폭이 {high - low:.0%}로 목표({ci_width_target:.0%}) 이하"
+    decision = sprt_balance_decision(wins, trials, sprt_delta, alpha, beta)
+    if decision == "imbalanced":
+        return f"순차검정(SPRT) 결과 {team} 쪽으로 기운 불균형 판정 ({wins}/{trials}승)"
+    if decision == "balanced":
+        return f"순차검정(SPRT) 결과 50:50 균형 판정 ({team} {wins}/{trials}승)"
+    return None
@@ -0,0 +1,248 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from core.match_stats import RESULT_COLUMNS
+
+# 게임 명세에서 지원하는 밤 행동과 승리 조건
+NIGHT_ACTIONS = ("kill", "protect", "investigate", "none")
+WIN_CONDITIONS = ("eliminate_others", "parity")
+DRAW_TEAM = "무승부"
+
+# 규칙 기반(스크립트) 에이전트의 기본 성향
+DEFAULT_POLICY = {
+    "reveal_investigation": 0.9,  # 조사 결과를 낮 토론에서 공개할 확률
+    "follow_reveal": 0.8,         # 공개된 정체를 믿고 그 플레이어에게 투표할 확률
+    "self_protect": 0.2,          # 보호 역할이 자기 자신을 지킬 확률
+}
+
+
+def validate_game_spec(spec):
+    """LLM이 만든 게임 명세(JSON)를 검사하고 기본값을 채운 사본 반환. 형식이 맞지 않으면 ValueError"""
+    if not isinstance(spec, dict) or not spec.get("roles") or not isinstance(spec["roles"], list):
+        raise ValueError("게임 명세에 역할(roles) 목록이 없습니다.")
+    if not isinstance(spec.get("teams", []), list):
+        raise ValueError("팀(teams)은 목록이어야 합니다.")
+
+    roles = []
+    for role in spec["roles"]:
+        if not isinstance(role, dict):
+            raise ValueError(f"역할 정의는 name/team/count 등을 가진 객체여야 합니다: {role}")
+        name, team = str(role.get("name", "")).strip(), str(role.get("team", "")).strip()
+        count = int(role.get("count", 0))
+        action = role.get("night_action", "none") or "none"
+        if not name or not team or count <= 0:
+            raise ValueError(f"역할 정의가 올바르지 않습니다: {role}")
+        if action not in NIGHT_ACTIONS:
+            raise ValueError(f"'{name}'의 밤 행동 '{action}'은(는) 지원하지 않습니다. ({', '.join(NIGHT_ACTIONS)})")
+        roles.append({"name": name, "team": team, "count": count, "night_action": action,
+                      "vote_weight": float(role.get("vote_weight", 1))})
+
+    role_teams = list(dict.fromkeys(role["team"] for role in roles))
+    for team in spec.get("teams", []):
+        if not isinstance(team, dict):
+            raise ValueError(f"팀 정의는 name/win_condition을 가진 객체여야 합니다: {team}")
+    declared = {team.get("name"): team for team in spec.get("teams", [])}
+    teams = []
+    for team in role_teams:
+        # 명세에 승리 조건이 없으면 살해 능력이 있는 팀은 '수적 우위', 나머지는 '상대 전멸'로 간주
+        has_killer = any(role["team"] == team and role["night_action"] == "kill" for role in roles)
+        condition = declared.get(team, {}).get("win_condition") or ("parity" if has_killer else "eliminate_others")
+        if condition not in WIN_CONDITIONS:
+            raise ValueError(f"'{team}'의 승리 조건 '{condition}'은(는) 지원하지 않습니다. ({', '.join(WIN_CONDITIONS)})")
+        teams.append({"name": team, "win_condition": condition})
+    if len(teams) < 2:
+        raise ValueError("서로 대립하는 팀이 2개 이상 필요합니다.")
+
+    max_days = int(spec.get("max_days", 30))
+    if max_days < 1:
+        raise ValueError(f"최대 일수(max_days)는 1 이상이어야 합니다: {max_days}")
+
+    return {
+        "title": spec.get("title", ""),
+        "roles": roles,
+        "teams": teams,
+        "day_vote": bool(spec.get("day_vote", True)),
+        "max_days": max_days,
+    }
+
+
+def _compile_arrays(spec):
+    """명세를 플레이어(좌석) 단위 배열로 변환"""
+    team_names = [team["name"] for team in spec["teams"]]
+    player_roles, player_teams, weights = [], [], []
+    for role_index, role in enumerate(spec["roles"]):
+        for _ in range(role["count"]):
+            player_roles.append(role_index)
+            player_teams.append(team_names.index(role["team"]))
+            weights.append(role["vote_weight"])
+    player_roles = np.array(player_roles)
+    player_teams = np.array(player_teams)
+    actions = np.array([spec["roles"][r]["night_action"] for r in player_roles])
+    killer_teams = np.unique(player_teams[actions == "kill"])
+    return {
+        "roles": player_roles,
+        "teams": player_teams,
+        "weights": np.array(weights),
+        "actions": actions,
+        "hostile": np.isin(player_teams, killer_teams),  # 살해 능력이 있는 팀 소속 여부
+        "team_onehot": np.eye(len(team_names), dtype=np.int32)[player_teams],
+        "conditions": [team["win_condition"] for team in spec["teams"]],
+    }
+
+
+def _random_choice(rng, candidates):
+    """(게임, 플레이어) 후보 마스크에서 게임마다 무작위로 1명 선택. 후보가 없으면 -1"""
+    scores = np.where(candidates, rng.random(candidates.shape), -1.0)
+    choice = scores.argmax(axis=1)
+    return np.where(candidates.any(axis=1), choice, -1)
+
+
+def _check_winners(arrays, alive, winners, done):
+    """아직 끝나지 않은 게임의 승리 팀을 판정해 winners/done을 갱신"""
+    team_alive = alive.astype(np.int32) @ arrays["team_onehot"]
+    total = team_alive.sum(axis=1)
+    for condition in ("eliminate_others", "parity"):
+        for team, team_condition in enumerate(arrays["conditions"]):
+            if team_condition != condition:
+                continue
+            counts = team_alive[:, team]
+            if condition == "eliminate_others":
+                won = (counts > 0) & (counts == total)
+            else:
+                won = (counts > 0) & (counts >= total - counts)
+            newly = won & ~done
+            winners[newly] = team
+            done |= newly
+    # 전원 사망 등 어느 팀도 남지 않은 경우
+    nobody = (total == 0) & ~done
+    done |= nobody
+
+
+def simulate_games(spec, num_games, seed=None, policy=None):
+    """규칙 기반 에이전트로 num_games판을 NumPy 배열 연산으로 한꺼번에 진행
+
+    반환값: (승리 팀 인덱스[-1=무승부], 진행 일수, 생존 마스크[게임, 플레이어])
+    """
+    policy = {**DEFAULT_POLICY, **(policy or {})}
+    rng = np.random.default_rng(seed)
+    arrays = _compile_arrays(spec)
+    num_players = len(arrays["roles"])
+    game_idx = np.arange(num_games)
+
+    alive = np.ones((num_games, num_players), dtype=bool)
+    revealed = np.zeros((num_games, num_players), dtype=bool)  # 조사로 정체가 공개된 적대 팀 플레이어
+    winners = np.full(num_games, -1)
+    turns = np.zeros(num_games, dtype=np.int32)
+    done = np.zeros(num_games, dtype=bool)
+    hostile = arrays["hostile"]
+    others = ~np.eye(num_players, dtype=bool)  # others[p]: p 자신을 제외한 플레이어
+
+    for day in range(1, spec["max_days"] + 1):
+        active = ~done
+        if not active.any():
+            break
+        turns[active] = day
+
+        # ----- 밤: 보호 → 살해 → 조사 -----
+        protected = np.zeros_like(alive)
+        for player in np.flatnonzero(arrays["actions"] == "protect"):
+            can_act = active & alive[:, player]
+            target = _random_choice(rng, alive & others[player])
+            target = np.where(rng.random(num_games) < policy["self_protect"], player, target)
+            rows = can_act & (target >= 0)
+            protected[game_idx[rows], target[rows]] = True
+
+        killers_alive = (alive & hostile & (arrays["actions"] == "kill")).any(axis=1)
+        victim = _random_choice(rng, alive & ~hostile)
+        rows = active & killers_alive & (victim >= 0)
+        rows &= ~protected[game_idx, np.maximum(victim, 0)]
+        alive[game_idx[rows], victim[rows]] = False
+
+        for player in np.flatnonzero(arrays["actions"] == "investigate"):
+            can_act = active & alive[:, player]
+            target = _random_choice(rng, alive & ~revealed & others[player])
+            rows = can_act & (target >= 0) & (rng.random(num_games) < policy["reveal_investigation"])
+            rows &= hostile[np.maximum(target, 0)]
+            revealed[game_idx[rows], target[rows]] = True
+
+        _check_winners(arrays, alive, winners, done)
+        if not spec["day_vote"]:
+            continue
+
+        # ----- 낮: 투표로 1명 처형 -----
+        active = ~done
+        # 선량한 쪽은 공개된 적대 플레이어를 우선 지목하고, 적대 팀은 선량한 쪽 중 무작위로 지목
+        scores = rng.random((num_games, num_players, num_players))
+        known = (alive & revealed)[:, None, :] & (rng.random((num_games, num_players, 1)) < policy["follow_reveal"])
+        scores += np.where(~hostile[None, :, None] & known, 2.0, 0.0)
+        scores += np.where(hostile[None, :, None] & ~hostile[None, None, :], 1.0, 0.0)
+        scores[:, np.arange(num_players), np.arange(num_players)] = -1.0  # 자기 자신에게는 투표하지 않음
+        scores = np.where(alive[:, None, :], scores, -2.0)
+        votes = scores.argmax(axis=2)
+
+        tally = np.zeros((num_games, num_players))
+        voter_weight = np.where(alive, arrays["weights"][None, :], 0.0)
+        np.add.at(tally, (np.repeat(game_idx, num_players), votes.ravel()), voter_weight.ravel())
+        tally += rng.random(tally.shape) * 1e-3  # 동점은 무작위로 결정
+        executed = np.where(alive, tally, -1.0).argmax(axis=1)
+        rows = active & (alive.sum(axis=1) > 1)
+        alive[game_idx[rows], executed[rows]] = False
+
+        _check_winners(arrays, alive, winners, done)
+
+    return winners, turns, alive
+
+
+def _simulate_chunk(args):
+    spec, num_games, seed, policy = args
+    return simulate_games(spec, num_games, seed, policy)
+
+
+def run_monte_carlo(spec, num_games=10000, workers=None, seed=None, policy=None, chunk_size=5000):
+    """여러 CPU 코어에 게임을 나누어 시뮬레이션하고 match_stats 형식의 결과 테이블 반환
+
+    반환값: (결과 DataFrame, 초당 진행 판수)
+    """
+    spec = validate_game_spec(spec)
+    started = time.perf_counter()
+    chunks = [min(chunk_size, num_games - offset) for offset in range(0, num_games, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    jobs = [(spec, size, chunk_seed, policy) for size, chunk_seed in zip(chunks, seeds)]
+
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            outputs = list(pool.map(_simulate_chunk, jobs))
+    else:
+        outputs = [_simulate_chunk(job) for job in jobs]
+
+    winners = np.concatenate([output[0] for output in outputs])
+    turns = np.concatenate([output[1] for output in outputs])
+    alive = np.concatenate([output[2] for output in outputs])
+    elapsed = time.perf_counter() - started
+    return _to_results_frame(spec, winners, turns, alive), num_games / max(elapsed, 1e-9)
+
+
+def _to_results_frame(spec, winners, turns, alive):
+    team_names = [team["name"] for team in spec["teams"]] + [DRAW_TEAM]
+    arrays = _compile_arrays(spec)
+    role_names = np.array([spec["roles"][r]["name"] for r in arrays["roles"]])
+    team_roles = [sorted({role["name"] for role in spec["roles"] if role["team"] == name}) for name in team_names[:-1]] + [[]]
+    surviving = [sorted(set(role_names[row])) for row in alive]
+    return pd.DataFrame({
+        "game_no": np.arange(1, len(winners) + 1),
+        "winning_team": [team_names[w] for w in winners],
+        "winning_roles": [team_roles[w] for w in winners],
+        "surviving_roles": surviving,
+        "key_reason": None,
+        "turn_count": turns,
+        "prompt_tokens": 0,
+        "output_tokens": 0,
+        "parsed": True,
+        "abort_reason": None,
+        "log": None,
+    }, columns=RESULT_COLUMNS)
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+def make_cache_key(model_name, prompt, generation_config=None):
+    """(모델명, 프롬프트, 생성 설정)을 해시해서 내용 기반 캐시 키 생성"""
+    payload = json.dumps(
+        {"model": model_name, "prompt": prompt, "config": generation_config or {}},
+        ensure_ascii=False, sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """LLM 응답 캐시 (메모리 LRU + 선택적 SQLite 디스크 계층)
+
+    값은 응답 청크의 리스트로 저장하여, 스트리밍 호출도 캐시 적중 시 같은 청크 단위로 재생할 수 있습니다.
+    - 메모리 계층: 최근 사용 순으로 max_memory_entries개까지 유지
+    - 디스크 계층: 전체 크기가 max_disk_bytes를 넘으면 가장 오래 사용하지 않은 항목부터 삭제
+    - 두 계층 모두 ttl_seconds가 지난 항목은 만료 처리
+    """
+
+    def __init__(self, max_memory_entries=256, disk_path=None, max_disk_bytes=50 * 1024 * 1024, ttl_seconds=7 * 24 * 60 * 60):
+        self.max_memory_entries = max_memory_entries
+        self.disk_path = disk_path
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl_seconds = ttl_seconds
+        self._memory = OrderedDict()  # key -> (저장 시각, 청크 리스트)
+        self._lock = threading.Lock()
+        self._disk_ready = False
+
+    # ---------- 디스크 계층 ----------
+    @contextmanager
+    def _connect(self):
+        """트랜잭션 단위로 연결을 열고 커밋 후 닫기 (스레드마다 별도 연결 사용)"""
+        os.makedirs(os.path.dirname(self.disk_path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.disk_path, timeout=5)
+        try:
+            if not self._disk_ready:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    "key TEXT PRIMARY KEY, chunks TEXT NOT NULL, size INTEGER NOT NULL, "
+                    "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed_at)")
+                self._disk_ready = True
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _disk_get(self, key, now):
+        try:
+            with self._connect() as conn:
+                row = conn.execute("SELECT chunks, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                if now - row[1] > self.ttl_seconds:
+                    conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    return None
+                conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+                return row[1], json.loads(row[0])
+        except (sqlite3.Error, OSError, ValueError):
+            return None
+
+    def _disk_put(self, key, chunks, now):
+        data = json.dumps(chunks, ensure_ascii=False)
+        size = len(data.encode("utf-8"))
+        if size > self.max_disk_bytes:
+            return
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, chunks, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, data, size, now, now)
+                )
+                conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+                # 용량 초과 시 가장 오래 사용하지 않은 항목부터 제거
+                total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+                if total > self.max_disk_bytes:
+                    for old_key, old_size in conn.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall():
+                        if total <= self.max_disk_bytes:
+                            break
+                        conn.execute("DELETE FROM responses WHERE key = ?", (old_key,))
+                        total -= old_size
+        except (sqlite3.Error, OSError):
+            pass
+
+    # ---------- 공개 API ----------
+    def get(self, key):
+        """캐시된 청크 리스트를 반환 (없거나 만료되었으면 None)"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if now - entry[0] <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    return list(entry[1])
+                del self._memory[key]
+
+        if not self.disk_path:
+            return None
+        entry = self._disk_get(key, now)
+        if entry is None:
+            return None
+        self._remember(key, entry[1], entry[0])
+        return list(entry[1])
+
+    def put(self, key, chunks):
+        now = time.time()
+        chunks = list(chunks)
+        self._remember(key, chunks, now)
+        if self.disk_path:
+            self._disk_put(key, chunks, now)
+
+    def discard(self, key):
+        """저장된 응답 하나를 삭제 (받은 응답이 쓸 수 없는 형식이었을 때 다음 요청에서 다시 생성하도록)"""
+        with self._lock:
+            self._memory.pop(key, None)
+        if self.disk_path:
+            try:
+                with self._connect() as conn:
+                    conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            except (sqlite3.Error, OSError):
+                pass
+
+    def _remember(self, key, chunks, created_at):
+        with self._lock:
+            self._memory[key] = (created_at, chunks)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        if self.disk_path:
+            try:
+                with self._connect() as conn:
+                    conn.execute("DELETE FROM responses")
+            except (sqlite3.Error, OSError):
+                pass
@@ -0,0 +1,183 @@
+import heapq
+import itertools
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+# 우선순위 (값이 작을수록 먼저 처리)
+PRIORITY_INTERACTIVE = 0  # 채팅, 룰 현황 추출 등 사용자가 화면 앞에서 기다리는 호출
+PRIORITY_NORMAL = 5       # 분석, 명세 변환 등 단발성 작업
+PRIORITY_BATCH = 10       # 시뮬레이션 배치
+
+
+class TokenBucket:
+    """분당 허용량을 초당 비율로 채워 넣는 토큰 버킷 (잔량이 음수가 되면 그만큼 다음 요청이 대기)"""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.refill_per_second = per_minute / 60.0
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_per_second)
+        self.updated_at = now
+
+    def wait_time(self, amount, now):
+        """amount만큼 꺼낼 수 있을 때까지 남은 시간(초)"""
+        self._refill(now)
+        amount = min(amount, self.capacity)  # 한 번에 용량보다 큰 요청도 언젠가는 통과하도록
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.refill_per_second
+
+    def consume(self, amount, now):
+        self._refill(now)
+        self.tokens -= amount
+
+
+class RequestScheduler:
+    """모든 LLM 호출이 거쳐 가는 프로세스 공용 스케줄러
+
+    - 분당 요청 수(RPM)와 분당 토큰 수(TPM)를 토큰 버킷으로 제한
+    - 대기열은 우선순위 순(같은 우선순위는 도착 순)으로 처리하며, 배치 호출은 동시 실행 한도 중
+      interactive_reserve개를 남겨 두어 대화형 호출이 배치에 밀려 굶지 않도록 함
+    - 동시 실행 한도는 AIMD로 조절: 정상 응답이 목표 지연 이내면 조금씩(+1/한도) 늘리고,
+      429(쿼터 초과)면 절반으로, 그 밖의 서버 오류면 3/4로 줄임
+    - call()/재시도 루프는 지터를 섞은 지수 백오프로 재시도
+    """
+
+    def __init__(self, rpm=60, tpm=1_000_000, max_concurrency=8, min_concurrency=1, initial_concurrency=4,
+                 target_latency=15.0, interactive_reserve=1, max_retries=4, base_delay=1.0, max_delay=30.0):
+        self.request_bucket = TokenBucket(rpm)
+        self.token_bucket = TokenBucket(tpm)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.limit = float(min(max(initial_concurrency, min_concurrency), max_concurrency))
+        self.target_latency = target_latency
+        self.interactive_reserve = interactive_reserve
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.in_flight = 0
+        self.rate_limited_count = 0
+        self._waiting = []  # (우선순위, 도착 순번)
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+
+    # ---------- 슬롯 획득/반납 ----------
+    def _capacity_for(self, priority):
+        limit = max(self.min_concurrency, int(self.limit))
+        if priority > PRIORITY_INTERACTIVE and limit > self.interactive_reserve:
+            return limit - self.interactive_reserve
+        return limit
+
+    def acquire(self, priority=PRIORITY_NORMAL, estimated_tokens=0):
+        ticket = (priority, next(self._sequence))
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    wait = None
+                    if self._waiting[0] == ticket and self.in_flight < self._capacity_for(priority):
+                        now = time.monotonic()
+                        wait = max(self.request_bucket.wait_time(1, now), self.token_bucket.wait_time(estimated_tokens, now))
+                        if wait == 0:
+                            self.request_bucket.consume(1, now)
+                            self.token_bucket.consume(estimated_tokens, now)
+                            self.in_flight += 1
+                            return
+                    self._cond.wait(timeout=wait if wait else 0.5)
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+
+    def release(self, latency=None, error=None, rate_limited=False):
+        """호출 결과를 반영해 동시 실행 한도를 조절하고 슬롯 반납"""
+        with self._cond:
+            self.in_flight -= 1
+            if rate_limited:
+                self.rate_limited_count += 1
+                self.limit = max(self.min_concurrency, self.limit / 2)
+            elif error is not None:
+                self.limit = max(self.min_concurrency, self.limit * 0.75)
+            elif latency is not None and latency <= self.target_latency:
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+    def charge_tokens(self, amount):
+        """응답을 받은 뒤 실제 출력 토큰만큼 TPM 버킷에서 추가 차감"""
+        with self._cond:
+            self.token_bucket.consume(amount, time.monotonic())
+
+    @contextmanager
+    def slot(self, priority=PRIORITY_NORMAL, estimated_tokens=0):
+        """with 블록 동안 슬롯을 점유. 블록 안에서 난 예외는 release에 반영한 뒤 다시 전달"""
+        self.acquire(priority, estimated_tokens)
+        started = time.monotonic()
+        state = {"latency": None}
+        try:
+            yield state
+        except GeneratorExit:
+            # 스트림 소비 측이 도중에 닫은 경우는 오류로 보지 않음
+            self.release(latency=state["latency"])
+            raise
+        except Exception as e:
+            self.release(error=e, rate_limited=is_rate_limit_error(e))
+            raise
+        else:
+            self.release(latency=state["latency"] if state["latency"] is not None else time.monotonic() - started)
+
+    # ---------- 재시도 ----------
+    def backoff_delay(self, attempt):
+        """전체 지터(full jitter) 지수 백오프"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def call(self, fn, priority=PRIORITY_NORMAL, estimated_tokens=0):
+        """fn()을 슬롯 안에서 실행하고, 재시도 가능한 오류면 백오프 후 다시 시도"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self.slot(priority, estimated_tokens):
+                    return fn()
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable_error(e):
+                    raise
+            time.sleep(self.backoff_delay(attempt))
+
+    def stats(self):
+        with self._cond:
+            return {
+                "concurrency_limit": max(self.min_concurrency, int(self.limit)),
+                "in_flight": self.in_flight,
+                "waiting": len(self._waiting),
+                "rate_limited": self.rate_limited_count,
+            }
+
+
+def _status_code(error):
+    code = getattr(error, "code", None)
+    return getattr(code, "value", code)
+
+
+def is_rate_limit_error(error):
+    return _status_code(error) == 429 or type(error).__name__ in ("ResourceExhausted", "TooManyRequests")
+
+
+def is_retryable_error(error):
+    """쿼터 초과/일시적 서버 오류만 재시도 (잘못된 요청, 인증 오류 등은 즉시 실패)"""
+    if is_rate_limit_error(error):
+        return True
+    return _status_code(error) in (500, 502, 503, 504) or type(error).__name__ in (
+        "ServiceUnavailable", "InternalServerError", "DeadlineExceeded", "ConnectionError", "TimeoutError")
+
+def is_missing_cache_error(error):
+    """서버 측 캐시(CachedContent)가 만료/삭제되어 찾을 수 없는 경우"""
+    if _status_code(error) == 404 or type(error).__name__ == "NotFound":
+        return True
+    return _status_code(error) in (400, 403) and "cache" in str(error).lower()
+
+def is_timeout_error(error):
+    """요청 기한(timeout)을 넘겨 끊긴 경우"""
+    return isinstance(error, TimeoutError) or type(error).__name__ in ("DeadlineExceeded", "TimeoutError", "ReadTimeout")
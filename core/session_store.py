@@ -0,0 +1,189 @@
+import gzip
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from core.match_stats import RESULT_COLUMNS, parse_match_logs, results_from_dict
+
+# 한 세션에 쌓이는 기록의 종류 (한 행 = 메시지 1개 / 시뮬레이션 1판 / 분석 보고서 1개)
+EVENT_KINDS = ("message", "match", "analysis")
+# 행 단위로 쌓지 않고 최신 값만 유지하는 세션 상태
+STATE_KEYS = ("final_rules", "chat_context", "game_spec")
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+class SessionStore:
+    """세션 기록을 행 단위로 추가만 하는 SQLite 저장소
+
+    거대한 문자열을 session_state에 계속 이어 붙이거나 리런마다 전체 백업 JSON을 다시 만드는 대신,
+    메시지/시뮬레이션/분석을 한 행씩 추가하고 필요한 구간만 페이지 단위로 읽습니다.
+    백업 파일은 다운로드를 요청할 때만 행을 차례로 읽어 기존 백업 JSON 형식으로 만들어 냅니다.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._ready = False
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _connect(self):
+        """트랜잭션 단위로 연결을 열고 커밋 후 닫기 (스레드마다 별도 연결 사용)"""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            if not self._ready:
+                with self._lock:
+                    conn.execute("CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, created_at REAL NOT NULL)")
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS events ("
+                        "id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, kind TEXT NOT NULL, "
+                        "payload TEXT NOT NULL, created_at REAL NOT NULL)"
+                    )
+                    conn.execute("CREATE INDEX IF NOT EXISTS idx_events_session ON events(session_id, kind, id)")
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS state ("
+                        "session_id TEXT NOT NULL, key TEXT NOT NULL, value TEXT, PRIMARY KEY (session_id, key))"
+                    )
+                    self._ready = True
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    # ---------- 세션 ----------
+    def create_session(self):
+        session_id = uuid.uuid4().hex[:12]
+        with self._connect() as conn:
+            conn.execute("INSERT INTO sessions (id, created_at) VALUES (?, ?)", (session_id, time.time()))
+        return session_id
+
+    def has_session(self, session_id):
+        with self._connect() as conn:
+            return conn.execute("SELECT 1 FROM sessions WHERE id = ?", (session_id,)).fetchone() is not None
+
+    # ---------- 기록 추가/조회 ----------
+    def append(self, session_id, kind, payload):
+        self.append_many(session_id, kind, [payload])
+
+    def append_many(self, session_id, kind, payloads):
+        if kind not in EVENT_KINDS:
+            raise ValueError(f"지원하지 않는 기록 종류입니다: {kind}")
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO events (session_id, kind, payload, created_at) VALUES (?, ?, ?, ?)",
+                [(session_id, kind, _dumps(payload), now) for payload in payloads]
+            )
+
+    def count(self, session_id, kind):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM events WHERE session_id = ? AND kind = ?",
+                                (session_id, kind)).fetchone()[0]
+
+    def page(self, session_id, kind, offset=0, limit=20):
+        """추가된 순서로 offset번째부터 limit개"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT payload FROM events WHERE session_id = ? AND kind = ? ORDER BY id LIMIT ? OFFSET ?",
+                (session_id, kind, limit, offset)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def latest(self, session_id, kind):
+        with self._connect() as conn:
+            row = conn.execute("SELECT payload FROM events WHERE session_id = ? AND kind = ? ORDER BY id DESC LIMIT 1",
+                               (session_id, kind)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def iter_events(self, session_id, kind, batch_size=200):
+        """기록을 batch_size개씩 끊어 읽으며 차례로 반환 (전체를 한 번에 메모리에 올리지 않음)"""
+        last_id = 0
+        while True:
+            with self._connect() as conn:
+                rows = conn.execute(
+                    "SELECT id, payload FROM events WHERE session_id = ? AND kind = ? AND id > ? ORDER BY id LIMIT ?",
+                    (session_id, kind, last_id, batch_size)
+                ).fetchall()
+            for row_id, payload in rows:
+                yield json.loads(payload)
+            if len(rows) < batch_size:
+                return
+            last_id = rows[-1][0]
+
+    # ---------- 상태 ----------
+    def set_state(self, session_id, key, value):
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO state (session_id, key, value) VALUES (?, ?, ?)",
+                         (session_id, key, _dumps(value)))
+
+    def get_state(self, session_id, key, default=None):
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM state WHERE session_id = ? AND key = ?", (session_id, key)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    # ---------- 백업 가져오기/내보내기 ----------
+    def import_backup(self, data):
+        """기존 백업 JSON(dict)을 새 세션으로 가져오고 세션 ID 반환
+
+        결과 테이블(sim_results)이 없는 예전 백업은 sim_logs_history 문자열에서 판별 기록을 다시 읽습니다.
+        """
+        session_id = self.create_session()
+        self.append_many(session_id, "message", data.get("messages") or [])
+        for key in STATE_KEYS:
+            if data.get(key):
+                self.set_state(session_id, key, data[key])
+        if data.get("sim_results"):
+            results_df = results_from_dict(data["sim_results"])
+            records = results_df.astype(object).where(results_df.notna(), None).to_dict(orient="records")
+        else:
+            records = parse_match_logs(data.get("sim_logs_history", ""))
+        self.append_many(session_id, "match", records)
+        if data.get("analysis_feedback"):
+            self.append(session_id, "analysis", {"text": data["analysis_feedback"]})
+        return session_id
+
+    def export_chunks(self, session_id):
+        """세션을 기존 백업 JSON 형식의 문자열 조각으로 차례로 생성
+
+        sim_results는 열 단위 대신 행(dict) 리스트로 내보냅니다. (results_from_dict가 두 형식 모두 읽음)
+        판별 로그는 sim_results의 log 열에만 담고, 같은 내용을 반복하는 sim_logs_history는 내보내지 않습니다.
+        """
+        yield "{\n\"messages\": ["
+        for i, message in enumerate(self.iter_events(session_id, "message")):
+            yield ("," if i else "") + "\n" + _dumps(message)
+        yield "\n]"
+        for key in STATE_KEYS:
+            yield f",\n{_dumps(key)}: " + _dumps(self.get_state(session_id, key, "" if key == "final_rules" else None))
+
+        yield ",\n\"sim_results\": ["
+        for i, record in enumerate(self.iter_events(session_id, "match")):
+            yield ("," if i else "") + "\n" + _dumps({column: record.get(column) for column in RESULT_COLUMNS})
+        yield "\n]"
+        analysis = self.latest(session_id, "analysis")
+        yield ",\n\"analysis_feedback\": " + _dumps(analysis["text"] if analysis else "") + "\n}\n"
+
+    def export_gzip(self, session_id):
+        """export_chunks를 gzip으로 압축한 바이트 (다운로드를 요청할 때만 호출)"""
+        buffer = io.BytesIO()
+        with gzip.GzipFile(fileobj=buffer, mode="wb") as f:
+            for chunk in self.export_chunks(session_id):
+                f.write(chunk.encode("utf-8"))
+        return buffer.getvalue()
+
+
+def load_backup_file(raw):
+    """업로드한 백업 파일(.json 또는 .json.gz 바이트)을 dict로 변환"""
+    if raw[:2] == b"\x1f\x8b":
+        raw = gzip.decompress(raw)
+    return json.loads(raw.decode("utf-8"))
+
+
+session_store = SessionStore(os.getenv("SESSION_STORE_PATH", os.path.join(".cache", "sessions.sqlite")))
@@ -0,0 +1,233 @@
+import json
+import math
+import os
+import threading
+import time
+import uuid
+
+from core.call_metrics import set_metrics_session
+from core.llm_engine import run_simulation_matches
+from core.match_stats import append_records, early_stop_reason, new_results_frame
+
+# 작업별 진행 상황을 저장하는 디렉터리 (페이지를 닫거나 서버가 재시작되어도 이어서 진행 가능)
+JOBS_DIR = os.getenv("SIM_JOBS_DIR", os.path.join(".cache", "sim_jobs"))
+
+ACTIVE_STATUSES = ("queued", "running")
+# 조기 종료된 작업은 이미 결론이 났으므로 이어서 진행하지 않음 (이어 가도 같은 조건으로 바로 다시 멈춤)
+RESUMABLE_STATUSES = ("cancelled", "interrupted", "failed")
+
+
+class SimulationJob:
+    """백그라운드 스레드에서 진행되는 시뮬레이션 배치 1건
+
+    완료된 판은 즉시 디스크(matches.jsonl)에 한 줄씩 추가되므로, 중단되거나 서버가 재시작된 작업도
+    남은 판만 이어서 진행할 수 있습니다. UI 스레드는 snapshot()으로 진행 상황만 읽어 갑니다.
+    """
+
+    def __init__(self, job_id, rules_text, num_games, max_concurrency=4, use_cache=False, adaptive=None, games_per_call=1,
+                 session_id=None):
+        self.id = job_id
+        self.rules_text = rules_text
+        self.num_games = num_games
+        self.max_concurrency = max_concurrency
+        self.use_cache = use_cache
+        self.adaptive = adaptive  # early_stop_reason에 넘길 설정 dict (없으면 고정 판수)
+        self.games_per_call = games_per_call  # 1보다 크면 호출 1회에 여러 판을 JSON으로 받는 배치 모드
+        self.session_id = session_id  # 작업을 시작한 세션 (호출 계측을 세션별로 나눠 보기 위함)
+        self.status = "queued"
+        self.created_at = time.time()
+        self.error = None
+        self.early_stop_message = None
+        self.records = {}     # 판 번호(0부터) -> match_stats 레코드
+        self.live_text = {}   # 진행 중인 판 번호 -> 지금까지 받은 텍스트
+        self.started_calls = 0  # 실제로 시작된 LLM 호출 수 (배치 모드는 호출 1회 = 여러 판, 절약한 호출 수 계산용)
+        self._stop = threading.Event()
+        self._cancelled = False
+        self._lock = threading.Lock()
+        self._thread = None
+
+    # ---------- 저장/복원 ----------
+    @property
+    def directory(self):
+        return os.path.join(JOBS_DIR, self.id)
+
+    def _save_meta(self):
+        os.makedirs(self.directory, exist_ok=True)
+        meta = {
+            "id": self.id, "rules_text": self.rules_text, "num_games": self.num_games,
+            "max_concurrency": self.max_concurrency, "use_cache": self.use_cache, "adaptive": self.adaptive,
+            "games_per_call": self.games_per_call, "session_id": self.session_id,
+            "status": self.status, "created_at": self.created_at, "error": self.error,
+            "early_stop_message": self.early_stop_message, "started_calls": self.started_calls,
+        }
+        tmp_path = os.path.join(self.directory, "meta.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(self.directory, "meta.json"))
+
+    def _append_record(self, index, record):
+        with open(os.path.join(self.directory, "matches.jsonl"), "a", encoding="utf-8") as f:
+            f.write(json.dumps({"index": index, "record": record}, ensure_ascii=False) + "\n")
+
+    @classmethod
+    def load(cls, job_id):
+        """디스크에 저장된 작업 복원. 실행 중이던 작업은 이 프로세스에서 이어지지 않으므로 'interrupted'로 표시"""
+        directory = os.path.join(JOBS_DIR, job_id)
+        try:
+            with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        job = cls(meta["id"], meta["rules_text"], meta["num_games"], meta["max_concurrency"],
+                  meta.get("use_cache", False), meta.get("adaptive"), meta.get("games_per_call", 1), meta.get("session_id"))
+        job.created_at = meta.get("created_at", job.created_at)
+        job.error = meta.get("error")
+        job.early_stop_message = meta.get("early_stop_message")
+        job.started_calls = meta.get("started_calls", len(meta.get("started", [])))
+        job.status = "interrupted" if meta["status"] in ACTIVE_STATUSES else meta["status"]
+        try:
+            with open(os.path.join(directory, "matches.jsonl"), encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue # 기록 도중 끊긴 마지막 줄은 무시
+                    job.records[entry["index"]] = entry["record"]
+        except OSError:
+            pass
+        return job
+
+    # ---------- 실행 제어 ----------
+    @property
+    def is_active(self):
+        return self.status in ACTIVE_STATUSES
+
+    @property
+    def can_resume(self):
+        return self.status in RESUMABLE_STATUSES and len(self.records) < self.num_games
+
+    def start(self):
+        """남은 판을 백그라운드 스레드에서 진행 (처음 시작과 이어서 진행 모두 이 경로 사용)"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop = threading.Event()
+            self._cancelled = False
+            self.early_stop_message = None
+            self.error = None
+            self.status = "running"
+            self._save_meta()
+            self._thread = threading.Thread(target=self._run, name=f"sim-job-{self.id}", daemon=True)
+            self._thread.start()
+
+    def cancel(self):
+        """진행 중인 스트림은 다음 청크에서 바로 끊고, 아직 시작하지 않은 판은 실행하지 않음"""
+        self._cancelled = True
+        self._stop.set()
+
+    def _committed_prefix(self):
+        """판 번호 순서로 끊김 없이 완료된 앞부분 레코드 (조기 종료 판단을 결정적으로 만들기 위함)"""
+        prefix = []
+        while len(prefix) < self.num_games and len(prefix) in self.records:
+            prefix.append(self.records[len(prefix)])
+        return prefix
+
+    def _run(self):
+        set_metrics_session(self.session_id)
+        remaining = [i for i in range(self.num_games) if i not in self.records]
+        started_batches = set()  # 이번 실행에서 호출이 시작된 배치 번호 (run_simulation_matches와 같은 방식으로 묶음)
+
+        def _mark_started(k):
+            batch = k // max(1, self.games_per_call)
+            if batch not in started_batches:
+                started_batches.add(batch)
+                self.started_calls += 1
+
+        try:
+            for k, kind, payload in run_simulation_matches(self.rules_text, len(remaining), self.max_concurrency,
+                                                           stop_event=self._stop, use_cache=self.use_cache,
+                                                           games_per_call=self.games_per_call):
+                index = remaining[k]
+                if kind == "chunk":
+                    with self._lock:
+                        _mark_started(k)
+                        self.live_text[index] = self.live_text.get(index, "") + payload
+                    continue
+
+                with self._lock:
+                    self.live_text.pop(index, None)
+                    if payload is None:
+                        continue # 취소/조기 종료로 중단된 판
+                    _mark_started(k)
+                    self.records[index] = payload
+                self._append_record(index, payload)
+
+                if self.adaptive and not self._stop.is_set():
+                    prefix = self._committed_prefix()
+                    message = early_stop_reason(append_records(new_results_frame(), prefix), **self.adaptive)
+                    if message:
+                        self.early_stop_message = message
+                        self._stop.set()
+
+            if self._cancelled:
+                self.status = "cancelled"
+            elif self.early_stop_message:
+                self.status = "early_stopped"
+            else:
+                self.status = "completed"
+        except Exception as e:
+            self.error = str(e)
+            self.status = "failed"
+        finally:
+            with self._lock:
+                self.live_text.clear()
+            self._save_meta()
+
+    # ---------- UI 조회 ----------
+    def snapshot(self):
+        """UI 스레드에서 안전하게 읽을 수 있는 진행 상황 사본"""
+        with self._lock:
+            return {
+                "status": self.status,
+                "completed": len(self.records),
+                "total": self.num_games,
+                "live_text": dict(self.live_text),
+                "winners": {index: record.get("winning_team") for index, record in self.records.items()},
+                "early_stop_message": self.early_stop_message,
+                "saved_calls": max(0, math.ceil(self.num_games / max(1, self.games_per_call)) - self.started_calls),
+                "error": self.error,
+            }
+
+    def ordered_records(self):
+        """완료된 레코드를 판 번호 순서로 반환"""
+        with self._lock:
+            return [(index, self.records[index]) for index in sorted(self.records)]
+
+
+class SimulationJobManager:
+    """프로세스 전체에서 공유하는 시뮬레이션 작업 목록 (메모리에 없으면 디스크에서 복원)"""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, rules_text, num_games, max_concurrency=4, use_cache=False, adaptive=None, games_per_call=1,
+               session_id=None):
+        job = SimulationJob(uuid.uuid4().hex[:12], rules_text, num_games, max_concurrency, use_cache, adaptive, games_per_call,
+                            session_id)
+        with self._lock:
+            self._jobs[job.id] = job
+        job.start()
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                job = SimulationJob.load(job_id)
+                if job is not None:
+                    self._jobs[job_id] = job
+            return job
+
+
+job_manager = SimulationJobManager()
@@ -0,0 +1,344 @@
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from core.call_metrics import bind_metrics_session, set_metrics_session
+from core.llm_engine import generate_rule_variant, run_simulation_matches
+from core.match_stats import append_records, balance_gap, new_results_frame
+
+# 스윕 작업별 진행 상황을 저장하는 디렉터리 (새로고침/서버 재시작 후에도 결과를 다시 보거나 이어서 진행)
+SWEEPS_DIR = os.getenv("SWEEP_JOBS_DIR", os.path.join(".cache", "sweep_jobs"))
+
+ACTIVE_STATUSES = ("queued", "running")
+RESUMABLE_STATUSES = ("cancelled", "interrupted", "failed")
+
+# 후보가 라운드에서 탈락한 이유
+ELIMINATION_REASONS = {
+    "clearly_worse": "확실히 불균형",
+    "halving": "하위 절반",
+}
+
+RANKING_COLUMNS = [
+    "rank", "variant", "change", "games", "top_team", "top_rate", "ci_low", "ci_high",
+    "gap", "gap_low", "gap_high", "status",
+]
+
+
+def allocate_round(gaps, budget):
+    """이번 라운드 예산(판수)을 후보별로 나눔
+
+    gaps는 후보 -> match_stats.balance_gap 결과입니다. 모든 후보에 최소 1판을 주고, 나머지는 불균형도 구간이
+    넓은(아직 불확실한) 후보에 비례해 더 많이 배분합니다. 예산이 후보 수보다 적으면 가장 불확실한 후보부터 1판씩.
+    """
+    if budget <= 0 or not gaps:
+        return {}
+    # 구간 폭이 0인 후보도 완전히 제외되지 않도록 최소 가중치를 둠
+    widths = {key: max(gap["gap_high"] - gap["gap_low"], 0.05) for key, gap in gaps.items()}
+    keys = sorted(widths, key=lambda key: -widths[key])
+    if budget < len(keys):
+        return {key: 1 for key in keys[:budget]}
+
+    extra = budget - len(keys)
+    total = sum(widths.values())
+    shares = {key: extra * widths[key] / total for key in keys}
+    allocation = {key: 1 + int(shares[key]) for key in keys}
+    # 소수점 아래로 버린 판은 나머지가 큰 후보부터 1판씩 (최대 잉여 배분)
+    leftover = budget - sum(allocation.values())
+    for key in sorted(keys, key=lambda key: -(shares[key] - int(shares[key])))[:leftover]:
+        allocation[key] += 1
+    return allocation
+
+
+def select_survivors(gaps, keep):
+    """라운드가 끝난 후보 중 다음 라운드로 넘길 후보와 탈락 후보(-> 이유)를 반환
+
+    1) 불균형도 구간의 하한이 다른 후보의 상한보다 크면(확실히 더 불균형) 바로 탈락
+    2) 남은 후보 중 불균형도 추정치가 작은 순서로 keep개만 유지 (successive halving)
+    """
+    best_high = min(gap["gap_high"] for gap in gaps.values())
+    eliminated = {key: "clearly_worse" for key, gap in gaps.items() if gap["gap_low"] > best_high}
+    remaining = sorted(
+        (key for key in gaps if key not in eliminated),
+        # 집계된 판이 없는 후보는 가장 나쁜 경우(0.5)로 간주
+        key=lambda key: (gaps[key]["gap"] if gaps[key]["gap"] is not None else 0.5, gaps[key]["gap_high"]),
+    )
+    for key in remaining[keep:]:
+        eliminated[key] = "halving"
+    return remaining[:keep], eliminated
+
+
+def rank_variants(variants, records):
+    """후보별 결과를 순위표로 정리
+
+    끝까지 남은 후보가 위, 그다음 늦게 탈락한 순서이며, 같은 그룹 안에서는 불균형도 추정치가 작은 순서입니다.
+    """
+    rows = []
+    for index, variant in enumerate(variants):
+        variant_records = records.get(index, [])
+        gap = balance_gap(append_records(new_results_frame(), variant_records))
+        if variant.get("eliminated_round") is None:
+            status, order = "최종 후보", math.inf
+        else:
+            reason = ELIMINATION_REASONS.get(variant.get("elimination_reason"), "")
+            status, order = f"{variant['eliminated_round']}라운드 탈락 ({reason})", variant["eliminated_round"]
+        rows.append({
+            "variant": variant["name"], "change": variant.get("change") or "(원본 규칙)",
+            "games": len(variant_records), "top_team": gap["top_team"], "top_rate": gap["top_rate"],
+            "ci_low": gap["ci_low"], "ci_high": gap["ci_high"],
+            "gap": gap["gap"], "gap_low": gap["gap_low"], "gap_high": gap["gap_high"],
+            "status": status, "_order": order,
+        })
+    ranking = pd.DataFrame(rows)
+    if ranking.empty:
+        return pd.DataFrame(columns=RANKING_COLUMNS)
+    ranking = ranking.sort_values(["_order", "gap"], ascending=[False, True], na_position="last", ignore_index=True)
+    ranking["rank"] = range(1, len(ranking) + 1)
+    return ranking[RANKING_COLUMNS]
+
+
+class VariantSweepJob:
+    """룰 변형 여러 개를 하나의 시뮬레이션 예산으로 비교하는 백그라운드 작업
+
+    1) 확정된 룰북에 변경 사항을 하나씩 반영한 변형 룰북을 생성 (LLM 1회씩)
+    2) 라운드마다 남은 예산을 남은 라운드 수(log2(후보 수))로 나눠, 불확실한 후보에 더 많은 판을 배분해 시뮬레이션
+    3) 라운드가 끝나면 확실히 불균형한 후보와 하위 절반을 탈락시키고, 후보가 1개 남거나 예산을 다 쓰면 종료
+    완료된 판은 즉시 디스크(matches.jsonl)에 추가되므로, 중단된 작업도 이어서 진행할 수 있습니다.
+    """
+
+    def __init__(self, job_id, rules_text, changes, budget, max_concurrency=4, min_games_per_round=4,
+                 include_original=True, games_per_call=1, session_id=None):
+        self.id = job_id
+        self.rules_text = rules_text
+        self.budget = budget  # 전체 후보가 나눠 쓰는 시뮬레이션 판수
+        self.max_concurrency = max_concurrency
+        self.min_games_per_round = min_games_per_round  # 라운드마다 후보 1개에 주는 최소 판수
+        self.games_per_call = games_per_call
+        self.session_id = session_id  # 스윕을 시작한 세션 (호출 계측을 세션별로 나눠 보기 위함)
+        self.variants = []
+        if include_original:
+            self.variants.append({"name": "원본", "change": None, "rules_text": rules_text})
+        for number, change in enumerate(changes, start=1):
+            self.variants.append({"name": f"변형 {number}", "change": change, "rules_text": None})
+        for variant in self.variants:
+            variant.setdefault("eliminated_round", None)
+            variant.setdefault("elimination_reason", None)
+        self.status = "queued"
+        self.phase = None  # "generating" / "simulating"
+        self.round = 0
+        self.created_at = time.time()
+        self.error = None
+        self.records = {}  # 후보 번호 -> match_stats 레코드 리스트
+        self._stop = threading.Event()
+        self._cancelled = False
+        self._lock = threading.Lock()
+        self._thread = None
+
+    # ---------- 저장/복원 ----------
+    @property
+    def directory(self):
+        return os.path.join(SWEEPS_DIR, self.id)
+
+    def _save_meta(self):
+        os.makedirs(self.directory, exist_ok=True)
+        meta = {
+            "id": self.id, "rules_text": self.rules_text, "budget": self.budget,
+            "max_concurrency": self.max_concurrency, "min_games_per_round": self.min_games_per_round,
+            "games_per_call": self.games_per_call, "session_id": self.session_id,
+            "variants": self.variants, "round": self.round,
+            "status": self.status, "created_at": self.created_at, "error": self.error,
+        }
+        tmp_path = os.path.join(self.directory, "meta.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(self.directory, "meta.json"))
+
+    def _append_record(self, index, record):
+        with open(os.path.join(self.directory, "matches.jsonl"), "a", encoding="utf-8") as f:
+            f.write(json.dumps({"variant": index, "record": record}, ensure_ascii=False) + "\n")
+
+    @classmethod
+    def load(cls, job_id):
+        """디스크에 저장된 작업 복원. 실행 중이던 작업은 이 프로세스에서 이어지지 않으므로 'interrupted'로 표시"""
+        directory = os.path.join(SWEEPS_DIR, job_id)
+        try:
+            with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        job = cls(meta["id"], meta["rules_text"], [], meta["budget"], meta["max_concurrency"],
+                  meta["min_games_per_round"], include_original=False, games_per_call=meta.get("games_per_call", 1),
+                  session_id=meta.get("session_id"))
+        job.variants = meta["variants"]
+        job.round = meta.get("round", 0)
+        job.created_at = meta.get("created_at", job.created_at)
+        job.error = meta.get("error")
+        job.status = "interrupted" if meta["status"] in ACTIVE_STATUSES else meta["status"]
+        try:
+            with open(os.path.join(directory, "matches.jsonl"), encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue # 기록 도중 끊긴 마지막 줄은 무시
+                    job.records.setdefault(entry["variant"], []).append(entry["record"])
+        except OSError:
+            pass
+        return job
+
+    # ---------- 실행 제어 ----------
+    @property
+    def is_active(self):
+        return self.status in ACTIVE_STATUSES
+
+    @property
+    def can_resume(self):
+        return self.status in RESUMABLE_STATUSES and self.used_games < self.budget and len(self._active()) > 1
+
+    @property
+    def used_games(self):
+        with self._lock:
+            return sum(len(records) for records in self.records.values())
+
+    def start(self):
+        """백그라운드 스레드에서 진행 (처음 시작과 이어서 진행 모두 이 경로 사용)"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop = threading.Event()
+            self._cancelled = False
+            self.error = None
+            self.status = "running"
+            self._save_meta()
+            self._thread = threading.Thread(target=self._run, name=f"sweep-job-{self.id}", daemon=True)
+            self._thread.start()
+
+    def cancel(self):
+        self._cancelled = True
+        self._stop.set()
+
+    def _active(self):
+        return [index for index, variant in enumerate(self.variants) if variant["eliminated_round"] is None]
+
+    def _gaps(self, indices):
+        with self._lock:
+            return {index: balance_gap(append_records(new_results_frame(), self.records.get(index, [])))
+                    for index in indices}
+
+    def _generate_variants(self):
+        """아직 룰북이 없는 변형만 생성 (이어서 진행할 때 다시 만들지 않음)"""
+        pending = [variant for variant in self.variants if variant["rules_text"] is None]
+        if not pending:
+            return
+        self.phase = "generating"
+
+        def _generate(variant):
+            variant["rules_text"] = generate_rule_variant(self.rules_text, variant["change"])
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_concurrency, len(pending)))) as executor:
+            list(executor.map(bind_metrics_session(_generate), pending))
+        self._save_meta()
+
+    def _play_variant(self, index, num_games, max_concurrency):
+        # 후보마다 별도의 stop_event를 씀 (run_simulation_matches는 끝날 때 자신의 stop_event를 설정함)
+        stop_event = threading.Event()
+        for _, kind, record in run_simulation_matches(self.variants[index]["rules_text"], num_games, max_concurrency,
+                                                      stop_event=stop_event, games_per_call=self.games_per_call):
+            if self._stop.is_set():
+                stop_event.set()
+            if kind != "done" or record is None:
+                continue
+            with self._lock:
+                self.records.setdefault(index, []).append(record)
+            self._append_record(index, record)
+
+    def _play_round(self, allocation):
+        """배분된 판수만큼 후보들을 동시에 시뮬레이션 (전체 동시 진행 판수는 max_concurrency 이내)"""
+        workers = max(1, min(self.max_concurrency, len(allocation)))
+        per_variant = max(1, self.max_concurrency // workers)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(bind_metrics_session(self._play_variant), index, num_games, per_variant)
+                       for index, num_games in allocation.items()]
+            for future in futures:
+                future.result()
+
+    def _run(self):
+        set_metrics_session(self.session_id)
+        try:
+            self._generate_variants()
+            self.phase = "simulating"
+            active = self._active()
+            while not self._stop.is_set() and len(active) > 1:
+                remaining = self.budget - self.used_games
+                if remaining <= 0:
+                    break
+                # 남은 예산을 남은 라운드 수로 나누되, 후보마다 최소 판수는 보장
+                rounds_left = max(1, math.ceil(math.log2(len(active))))
+                round_budget = min(remaining, max(remaining // rounds_left, self.min_games_per_round * len(active)))
+                self._play_round(allocate_round(self._gaps(active), round_budget))
+                if self._stop.is_set():
+                    break
+
+                self.round += 1
+                active, eliminated = select_survivors(self._gaps(active), keep=math.ceil(len(active) / 2))
+                for index, reason in eliminated.items():
+                    self.variants[index]["eliminated_round"] = self.round
+                    self.variants[index]["elimination_reason"] = reason
+                self._save_meta()
+
+            self.status = "cancelled" if self._cancelled else "completed"
+        except Exception as e:
+            self.error = str(e)
+            self.status = "failed"
+        finally:
+            self.phase = None
+            self._save_meta()
+
+    # ---------- UI 조회 ----------
+    def snapshot(self):
+        """UI 스레드에서 안전하게 읽을 수 있는 진행 상황 사본"""
+        with self._lock:
+            return {
+                "status": self.status,
+                "phase": self.phase,
+                "round": self.round,
+                "budget": self.budget,
+                "used": sum(len(records) for records in self.records.values()),
+                "active": len(self._active()),
+                "error": self.error,
+                "ranking": rank_variants(self.variants, self.records),
+            }
+
+
+class VariantSweepManager:
+    """프로세스 전체에서 공유하는 스윕 작업 목록 (메모리에 없으면 디스크에서 복원)"""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, rules_text, changes, budget, max_concurrency=4, min_games_per_round=4, include_original=True,
+               games_per_call=1, session_id=None):
+        job = VariantSweepJob(uuid.uuid4().hex[:12], rules_text, changes, budget, max_concurrency, min_games_per_round,
+                              include_original, games_per_call, session_id)
+        with self._lock:
+            self._jobs[job.id] = job
+        job.start()
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                job = VariantSweepJob.load(job_id)
+                if job is not None:
+                    self._jobs[job_id] = job
+            return job
+
+
+sweep_manager = VariantSweepManager()
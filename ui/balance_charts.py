@@ -0,0 +1,44 @@
+import streamlit as st
+import plotly.graph_objects as go
+from core.match_stats import summarize_results
+
+def _rate_chart(rate_df, label, title):
+    """승률 막대 + 95% 신뢰구간 오차 막대"""
+    fig = go.Figure(go.Bar(
+        x=rate_df[label],
+        y=rate_df["rate"],
+        error_y=dict(
+            type="data", symmetric=False,
+            array=rate_df["ci_high"] - rate_df["rate"],
+            arrayminus=rate_df["rate"] - rate_df["ci_low"],
+        ),
+        text=[f"{rate:.0%}" for rate in rate_df["rate"]],
+        textposition="outside",
+    ))
+    fig.update_layout(title=title, yaxis=dict(range=[0, 1.05], tickformat=".0%"), height=320, margin=dict(t=40, b=10))
+    return fig
+
+def render_balance_stats(results_df, key_prefix="balance"):
+    """로컬에서 집계한 팀/역할별 승률과 신뢰구간을 표시"""
+    summary = summarize_results(results_df)
+    if summary["parsed_games"] == 0:
+        st.caption("아직 결과 요약 블록을 읽을 수 있는 시뮬레이션이 없습니다.")
+        return
+
+    metric_cols = st.columns(4)
+    metric_cols[0].metric("집계된 판수", f"{summary['parsed_games']} / {summary['games']}")
+    metric_cols[1].metric("평균 진행 턴", f"{summary['avg_turns']:.1f}" if summary["avg_turns"] is not None else "-")
+    metric_cols[2].metric("입력 토큰", f"{summary['prompt_tokens']:,}")
+    metric_cols[3].metric("출력 토큰", f"{summary['output_tokens']:,}")
+
+    team_col, role_col = st.columns(2)
+    with team_col:
+        st.plotly_chart(_rate_chart(summary["teams"], "team", "팀별 승률 (95% 신뢰구간)"),
+                        use_container_width=True, key=f"{key_prefix}_teams")
+    with role_col:
+        if not summary["roles"].empty:
+            st.plotly_chart(_rate_chart(summary["roles"], "role", "역할별 승률 (95% 신뢰구간)"),
+                            use_container_width=True, key=f"{key_prefix}_roles")
+        else:
+            st.plotly_chart(_rate_chart(summary["survival"], "role", "역할별 생존율 (95% 신뢰구간)"),
+                            use_container_width=True, key=f"{key_prefix}_survival")
@@ -0,0 +1,47 @@
+import time
+import streamlit as st
+import plotly.graph_objects as go
+from core.call_metrics import summarize_calls
+from core.llm_engine import call_metrics
+from ui.session import current_session_id
+
+def _latency_chart(summary):
+    fig = go.Figure([
+        go.Bar(name="p50", x=summary["feature"], y=summary["latency_p50"]),
+        go.Bar(name="p95", x=summary["feature"], y=summary["latency_p95"]),
+        go.Bar(name="첫 청크 p50", x=summary["feature"], y=summary["ttfc_p50"]),
+    ])
+    fig.update_layout(title="기능별 지연 (초)", barmode="group", height=300, margin=dict(t=40, b=10, l=10, r=10),
+                      legend=dict(orientation="h"))
+    return fig
+
+def _token_chart(summary):
+    fig = go.Figure([
+        go.Bar(name="입력", x=summary["feature"], y=summary["prompt_tokens"]),
+        go.Bar(name="출력", x=summary["feature"], y=summary["output_tokens"]),
+    ])
+    fig.update_layout(title="기능별 토큰 사용량", barmode="stack", height=300, margin=dict(t=40, b=10, l=10, r=10),
+                      legend=dict(orientation="h"))
+    return fig
+
+def render_call_metrics_panel():
+    """이번 세션(브라우저 탭을 연 이후) 동안의 LLM 호출 지연/토큰 사용량을 사이드바에 표시
+
+    이 세션에서 시작한 백그라운드 작업(시뮬레이션, 스윕, 룰 현황 추출)의 호출도 세션 ID로 함께 집계하며,
+    같은 서버 프로세스를 쓰는 다른 테스터의 호출은 제외합니다.
+    """
+    since = st.session_state.setdefault("metrics_since", time.time())
+    calls_df = call_metrics.to_frame(since=since, session_id=current_session_id())
+    if calls_df.empty:
+        st.caption("아직 기록된 LLM 호출이 없습니다.")
+        return
+
+    st.caption(f"호출 {len(calls_df)}회 · 캐시 적중 {int(calls_df['cache_hit'].sum())}회 · "
+               f"오류 {int(calls_df['error'].notna().sum())}회 · "
+               f"토큰 {int(calls_df['prompt_tokens'].sum() + calls_df['output_tokens'].sum()):,}")
+    summary = summarize_calls(calls_df)
+    st.plotly_chart(_latency_chart(summary), use_container_width=True, key="metrics_latency")
+    st.plotly_chart(_token_chart(summary), use_container_width=True, key="metrics_tokens")
+    if st.button("기록 초기화", key="metrics_reset"):
+        st.session_state.metrics_since = time.time()
+        st.rerun()
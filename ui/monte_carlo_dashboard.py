@@ -0,0 +1,67 @@
+import json
+import os
+import streamlit as st
+from core.llm_engine import compile_game_spec
+from core.monte_carlo import DEFAULT_POLICY, run_monte_carlo, validate_game_spec
+from ui.balance_charts import render_balance_stats
+from ui.session import save_state
+
+def render_monte_carlo_dashboard():
+    if "final_rules" not in st.session_state:
+        st.warning("👉 아직 확정된 게임 룰이 없습니다! 좌측의 [💬 게임 규칙 빌더] 탭에서 AI와 대화하며 게임을 먼저 완성해주세요.")
+        return
+
+    st.write("확정된 룰북을 한 번만 게임 명세(JSON)로 변환한 뒤, 규칙 기반 에이전트로 수천~수만 판을 로컬에서 빠르게 시뮬레이션합니다.")
+
+    # 1) 룰북 → 게임 명세 변환 (LLM 1회 호출)
+    if st.button("🧩 룰북을 게임 명세로 변환", type="primary" if "game_spec" not in st.session_state else "secondary"):
+        with st.spinner("AI가 룰북을 역할/행동/승리 조건 명세로 정리하고 있습니다..."):
+            try:
+                save_state("game_spec", compile_game_spec(st.session_state.final_rules))
+                st.session_state.pop("mc_results", None)
+            except Exception as e:
+                st.error(f"게임 명세 변환 중 오류가 발생했습니다: {str(e)}")
+
+    if "game_spec" not in st.session_state:
+        st.info("먼저 룰북을 게임 명세로 변환해주세요.")
+        return
+
+    with st.expander("현재 게임 명세 보기/수정", expanded=False):
+        edited = st.text_area("게임 명세 (JSON)", json.dumps(st.session_state.game_spec, ensure_ascii=False, indent=2), height=300)
+        if st.button("명세 수정 반영"):
+            try:
+                save_state("game_spec", validate_game_spec(json.loads(edited)))
+                st.session_state.pop("mc_results", None)
+                st.success("수정된 명세를 반영했습니다.")
+            except (ValueError, TypeError) as e:
+                st.error(f"명세 형식이 올바르지 않습니다: {str(e)}")
+
+    # 2) 대량 시뮬레이션
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        num_games = st.number_input("시뮬레이션 판수", min_value=1000, max_value=1000000, value=10000, step=1000)
+    with col2:
+        workers = st.number_input("사용할 CPU 코어 수", min_value=1, max_value=os.cpu_count() or 1, value=os.cpu_count() or 1)
+    with col3:
+        st.write("")
+        st.write("")
+        run_btn = st.button("🚀 몬테카를로 시뮬레이션 시작", type="primary")
+
+    with st.expander("에이전트 성향 설정"):
+        policy = {
+            "reveal_investigation": st.slider("조사 결과 공개 확률", 0.0, 1.0, DEFAULT_POLICY["reveal_investigation"]),
+            "follow_reveal": st.slider("공개된 정체를 믿고 투표할 확률", 0.0, 1.0, DEFAULT_POLICY["follow_reveal"]),
+            "self_protect": st.slider("보호 역할의 자기 보호 확률", 0.0, 1.0, DEFAULT_POLICY["self_protect"]),
+        }
+
+    if run_btn:
+        with st.spinner(f"{num_games:,}판을 시뮬레이션하고 있습니다..."):
+            results_df, games_per_second = run_monte_carlo(st.session_state.game_spec, int(num_games), workers=int(workers), policy=policy)
+        st.session_state.mc_results = results_df
+        st.session_state.mc_games_per_second = games_per_second
+
+    if "mc_results" in st.session_state:
+        st.divider()
+        st.subheader("📊 몬테카를로 시뮬레이션 결과")
+        st.caption(f"{len(st.session_state.mc_results):,}판 · 초당 약 {st.session_state.mc_games_per_second:,.0f}판 처리")
+        render_balance_stats(st.session_state.mc_results, key_prefix="mc")
@@ -1,13 +1,42 @@
 import streamlit as st
-from core.llm_engine import get_chat_response, stream_chat_response, stream_generate_content, extract_current_rules
+from core.llm_engine import stream_chat_response, new_chat_context, BackgroundRuleExtractor, invalidate_rulebook_context
+from ui.session import append_message, save_state
+
+def _render_rule_status():
+    """우측 룰 현황 본문. 백그라운드 추출이 진행 중이면 fragment로 이 부분만 주기적으로 다시 그립니다."""
+    extractor = st.session_state.rule_extractor
+    was_pending = extractor.pending
+    if extractor.poll():
+        st.session_state.current_rule_status = extractor.status
+
+    if "current_rule_status" in st.session_state:
+        st.info(st.session_state.current_rule_status)
+    else:
+        st.info("여기에 우리가 대화한 게임의 상태(참가자 수, 승계 조건 등)가 실시간으로 분석되어 표시됩니다.")
+
+    if extractor.pending:
+        st.caption("🔄 방금 대화를 바탕으로 현황판을 업데이트하고 있습니다...")
+    elif extractor.error:
+        st.caption(extractor.error)
+    elif was_pending:
+        # 추출이 끝났으면 전체 화면을 한 번 갱신해 주기적 새로고침을 멈춤
+        st.rerun()
+
 
 def render_rule_builder():
     if "messages" not in st.session_state:
         st.session_state.messages = []
-        st.session_state.messages.append({
+        append_message({
             "role": "assistant", 
             "content": "안녕하세요! 저는 게임 디자인 마스터입니다. 어떤 종류의 게임(예: 마피아, 먹이사슬 등)을 만드려고 하시나요? 참가 인원수와 대략적인 아이디어를 먼저 말씀해 주시면 체계적으로 룰을 세팅해 드릴게요."
         })
+    # 오래된 대화의 롤링 요약 상태 (매 턴 전체 대화를 다시 보내지 않기 위함)
+    if "chat_context" not in st.session_state:
+        st.session_state.chat_context = new_chat_context()
+    # 룰 현황 추출은 채팅 응답과 분리해 백그라운드에서 진행
+    if "rule_extractor" not in st.session_state:
+        st.session_state.rule_extractor = BackgroundRuleExtractor()
+        st.session_state.rule_extractor.reset(st.session_state.get("current_rule_status"), len(st.session_state.messages))
         
     chat_col, status_col = st.columns([5, 3])
     
@@ -15,7 +44,7 @@ def render_rule_builder():
     prompt = st.chat_input("새로운 룰 아이디어를 입력하세요...")
     
     if prompt:
-        st.session_state.messages.append({"role": "user", "content": prompt})
+        append_message({"role": "user", "content": prompt})
 
     # ==========================
     # 1) UI 선 그리기 (좌측 / 우측)
@@ -34,12 +63,14 @@ def render_rule_builder():
     # [우측] 실시간 룰 정리 현황 정적 렌더링
     with status_col:
         st.subheader("📋 실시간 룰 정리 현황")
-        status_placeholder = st.empty()
-        
-        if "current_rule_status" in st.session_state:
-            status_placeholder.info(st.session_state.current_rule_status)
-        else:
-            status_placeholder.info("여기에 우리가 대화한 게임의 상태(참가자 수, 승계 조건 등)가 실시간으로 분석되어 표시됩니다.")
+        extractor = st.session_state.rule_extractor
+        if extractor.poll():
+            st.session_state.current_rule_status = extractor.status
+        st.fragment(run_every=1 if extractor.pending else None)(_render_rule_status)()
+
+        context = st.session_state.chat_context
+        if context["last_prompt_tokens"]:
+            st.caption(f"직전 대화 프롬프트 약 {context['last_prompt_tokens']:,} 토큰 · 요약된 이전 메시지 {context['summarized_count']}개")
             
         # 첫 인사 외에 대화가 진행되었을 때만 완료 버튼 노출
         btn_placeholder = st.empty()
@@ -56,19 +87,14 @@ def render_rule_builder():
         # 1. 채팅창(좌측) 답변 생성 및 스트리밍 노출
         with assistant_placeholder.chat_message("assistant"):
             with st.spinner("규칙을 분석하고 답변을 준비 중입니다... 👀"):
-                response = st.write_stream(stream_chat_response(st.session_state.messages))
-            st.session_state.messages.append({"role": "assistant", "content": response})
+                response = st.write_stream(stream_chat_response(st.session_state.messages, st.session_state.chat_context))
+            append_message({"role": "assistant", "content": response})
+        # 이번 턴에 갱신된 롤링 요약도 저장 (새로고침/백업 후 이미 요약한 구간을 다시 요약하지 않도록)
+        save_state("chat_context", st.session_state.chat_context)
 
-        # 2. 상태창(우측) 요약 생성
-        # (현황판에 업데이트 중임을 알리는 상태 표시)
-        status_placeholder.info("🔄 방금 대화를 바탕으로 현황판을 업데이트하고 있습니다...")
-        
-        # 모델 요약 함수 호출 (이 동안 스트림은 아니지만 우측 UI가 이미 존재하므로 멈춰있는 느낌 해소)
-        new_status = extract_current_rules(st.session_state.messages)
-        st.session_state.current_rule_status = new_status
-        
-        # 결과 반영
-        status_placeholder.info(new_status)
+        # 2. 상태창(우측) 요약은 백그라운드에서 갱신 (룰과 무관한 턴이면 건너뜀)
+        # 연속 입력 시에는 마지막 요청만 실제로 호출되고, 이전 현황 + 새 메시지만 전달됩니다.
+        st.session_state.rule_extractor.submit(st.session_state.messages)
         
         # 깔끔하게 UI를 정리하기 위해 화면 갱신
         st.rerun()
@@ -85,12 +111,14 @@ def render_rule_builder():
                 temp_context = st.session_state.messages.copy()
                 temp_context.append({"role": "user", "content": summary_prompt})
                 
-                final_rules = st.write_stream(stream_chat_response(temp_context))
+                final_rules = st.write_stream(stream_chat_response(temp_context, st.session_state.chat_context))
                 
-                # 최종 룰을 세션에 저장
-                st.session_state.final_rules = final_rules
-                st.session_state.messages.append({"role": "user", "content": "여기까지의 룰을 확정해줘."})
-                st.session_state.messages.append({"role": "assistant", "content": "완성된 게임 룰북은 다음과 같습니다:\n\n" + final_rules})
+                # 이전 룰북으로 등록해 둔 시뮬레이션 컨텍스트 캐시는 폐기하고 최종 룰을 세션에 저장
+                if st.session_state.get("final_rules") != final_rules:
+                    invalidate_rulebook_context(st.session_state.get("final_rules"))
+                save_state("final_rules", final_rules)
+                append_message({"role": "user", "content": "여기까지의 룰을 확정해줘."})
+                append_message({"role": "assistant", "content": "완성된 게임 룰북은 다음과 같습니다:\n\n" + final_rules})
                 
             st.success("✅ 규칙이 성공적으로 확정되었습니다! 상단의 [📊 시뮬레이션 및 분석] 탭으로 이동하세요.")
 
@@ -0,0 +1,82 @@
+import streamlit as st
+from core.call_metrics import set_metrics_session
+from core.llm_engine import invalidate_rulebook_context, new_chat_context
+from core.match_stats import append_records, new_results_frame
+from core.session_store import session_store
+
+# 새로고침해도 같은 세션을 이어서 쓸 수 있도록 주소에 남기는 세션 ID
+SESSION_QUERY_PARAM = "session"
+# 세션에 딸린 백그라운드 작업 (session_state 키, 주소 파라미터)
+JOB_KEYS = (("sim_job_id", "sim_job"), ("sweep_job_id", "sweep_job"))
+
+def current_session_id():
+    """이 브라우저 탭의 세션 ID. 주소의 세션 ID가 저장소에 있으면 그 세션을 복원해서 사용"""
+    if "session_id" not in st.session_state:
+        session_id = st.query_params.get(SESSION_QUERY_PARAM)
+        if session_id and session_store.has_session(session_id):
+            # 같은 탭의 새로고침이므로 주소에 남아 있는 작업은 그대로 이어서 표시
+            restore_session(session_id, keep_jobs=True)
+        else:
+            st.session_state.session_id = session_store.create_session()
+        st.query_params[SESSION_QUERY_PARAM] = st.session_state.session_id
+    # 이번 리런에서 일어나는 LLM 호출을 이 세션의 호출로 기록
+    set_metrics_session(st.session_state.session_id)
+    return st.session_state.session_id
+
+def restore_session(session_id, keep_jobs=False):
+    """저장소의 세션을 session_state로 불러오기 (백업 가져오기와 새로고침 복원에서 공통 사용)
+
+    keep_jobs=False(백업 가져오기)이면 이전 세션에 붙어 있던 시뮬레이션/스윕 작업과 만들어 둔 백업 파일을 떼어 내,
+    이전 작업의 결과가 새 세션에 섞이지 않게 합니다.
+    """
+    st.session_state.session_id = session_id
+    st.query_params[SESSION_QUERY_PARAM] = session_id
+    set_metrics_session(session_id)
+    st.session_state.pop("backup_file", None)
+    if not keep_jobs:
+        for state_key, param in JOB_KEYS:
+            st.session_state.pop(state_key, None)
+            st.query_params.pop(param, None)
+
+    messages = list(session_store.iter_events(session_id, "message"))
+    if messages:
+        st.session_state.messages = messages
+    else:
+        st.session_state.pop("messages", None)
+    # 요약 상태가 없는 예전 백업은 다음 대화 때 처음부터 요약을 다시 구성
+    st.session_state.chat_context = session_store.get_state(session_id, "chat_context") or new_chat_context()
+    # 다른 대화의 룰 현황이 섞이지 않도록 현황판도 초기화
+    st.session_state.pop("current_rule_status", None)
+    st.session_state.pop("rule_extractor", None)
+
+    if not keep_jobs:
+        # 가져온 세션으로 교체되는 이 탭의 이전 룰북 컨텍스트만 폐기 (새로고침 복원에서는 폐기하지 않음)
+        invalidate_rulebook_context(st.session_state.get("final_rules"))
+    for key in ("final_rules", "game_spec"):
+        value = session_store.get_state(session_id, key)
+        if value:
+            st.session_state[key] = value
+        else:
+            st.session_state.pop(key, None)
+    st.session_state.pop("mc_results", None)
+
+    records = list(session_store.iter_events(session_id, "match"))
+    st.session_state.sim_results = append_records(new_results_frame(), records)
+    # 이미 반영한 백그라운드 작업 결과를 새로고침 후 다시 반영하지 않도록 복원
+    absorbed = {}
+    for record in records:
+        if record.get("job_id") is not None:
+            absorbed.setdefault(record["job_id"], set()).add(record["job_index"])
+    st.session_state.absorbed_job_matches = absorbed
+    analysis = session_store.latest(session_id, "analysis")
+    st.session_state.analysis_feedback = analysis["text"] if analysis else ""
+
+def append_message(message):
+    """대화 메시지를 화면용 목록과 세션 저장소에 함께 추가"""
+    st.session_state.messages.append(message)
+    session_store.append(current_session_id(), "message", message)
+
+def save_state(key, value):
+    """룰북/대화 요약/게임 명세처럼 최신 값만 유지하는 세션 상태 저장"""
+    st.session_state[key] = value
+    session_store.set_state(current_session_id(), key, value)
@@ -1,8 +1,74 @@
 import streamlit as st
-import time
-from core.llm_engine import stream_simulation_match, stream_analyze_simulation_results
+from core.llm_engine import stream_analyze_simulation_results
+from core.match_stats import ABORT_REASONS, append_records, build_analysis_digest, new_results_frame
+from core.session_store import session_store
+from core.sim_jobs import job_manager
+from ui.balance_charts import render_balance_stats
+from ui.session import current_session_id, save_state
+
+# 전체 로그 보기에서 한 페이지에 표시할 판수
+LOG_PAGE_SIZE = 10
+
+JOB_STATUS_LABELS = {
+    "queued": "대기 중",
+    "running": "진행 중",
+    "completed": "완료",
+    "early_stopped": "조기 종료",
+    "cancelled": "중단됨",
+    "interrupted": "서버 재시작으로 중단됨",
+    "failed": "오류로 중단됨",
+}
+
+def _render_job_progress(job_id):
+    """백그라운드 작업의 진행 상황. fragment로 감싸 이 부분만 1초마다 다시 그립니다."""
+    job = job_manager.get(job_id)
+    progress = job.snapshot()
+
+    st.progress(progress["completed"] / progress["total"],
+                text=f"시뮬레이션 {JOB_STATUS_LABELS[progress['status']]}... {progress['completed']} / {progress['total']}판 완료")
+    if st.button("🛑 중단 (진행된 결과 표시)", key=f"cancel_{job_id}"):
+        job.cancel()
+
+    # 진행 중인 판만 실시간 중계 (완료된 판은 작업이 끝난 뒤 한 번에 표시)
+    for index in sorted(progress["live_text"]):
+        with st.expander(f"🎲 [신규 게임 {index+1}] 실시간 중계", expanded=True):
+            st.markdown(progress["live_text"][index])
+    if progress["winners"]:
+        st.caption(" · ".join(f"{index+1}판: {winner or '결과 불명'}" for index, winner in sorted(progress["winners"].items())))
+
+    if not job.is_active:
+        # 작업이 끝났으면 전체 화면을 갱신해 결과 반영과 분석으로 넘어감
+        st.rerun()
+
+def _absorb_job_results(job):
+    """완료된 판을 판 번호 순서대로 결과 테이블과 세션 저장소에 반영. 새로 반영한 판 수를 반환"""
+    absorbed = st.session_state.absorbed_job_matches.setdefault(job.id, set())
+    new_records = [(index, record) for index, record in job.ordered_records() if index not in absorbed]
+    if not new_records:
+        return 0
+    absorbed.update(index for index, _ in new_records)
+    st.session_state.sim_results = append_records(st.session_state.sim_results, [record for _, record in new_records])
+    # 결과 테이블에서 부여된 누적 게임 번호를 그대로 저장 (작업 ID/판 번호는 새로고침 후 중복 반영 방지용)
+    numbered = st.session_state.sim_results.tail(len(new_records))["game_no"].tolist()
+    session_store.append_many(current_session_id(), "match", [
+        dict(record, game_no=int(game_no), job_id=job.id, job_index=index)
+        for (index, record), game_no in zip(new_records, numbered)
+    ])
+    return len(new_records)
+
+def _render_match_log_viewer(session_id, total):
+    """저장소에서 현재 페이지의 판만 읽어서 표시"""
+    pages = (total + LOG_PAGE_SIZE - 1) // LOG_PAGE_SIZE
+    page = st.number_input(f"페이지 (전체 {pages}쪽)", min_value=1, max_value=pages, value=pages, key="log_page")
+    for record in session_store.page(session_id, "match", offset=(page - 1) * LOG_PAGE_SIZE, limit=LOG_PAGE_SIZE):
+        st.markdown(f"### [게임 {record.get('game_no')} 요약]\n" + (record.get("log") or ""))
 
 def render_simulation_dashboard():
+    if "final_rules" not in st.session_state and st.query_params.get("sim_job"):
+        # 새로고침으로 세션이 초기화되었다면 진행 중이던 작업의 룰북으로 복원
+        job = job_manager.get(st.query_params["sim_job"])
+        if job is not None:
+            save_state("final_rules", job.rules_text)
     if "final_rules" not in st.session_state:
         st.warning("👉 아직 확정된 게임 룰이 없습니다! 좌측의 [💬 게임 규칙 빌더] 탭에서 AI와 대화하며 게임을 먼저 완성해주세요.")
         return
@@ -10,14 +76,21 @@ def render_simulation_dashboard():
     st.write("확정된 게임 규칙을 바탕으로 AI 에이전트들이 시뮬레이션을 진행합니다.")
     
     # 기존 백업된 기록이 있다면 화면 상단에 표시
-    if "sim_logs_history" not in st.session_state:
-        st.session_state.sim_logs_history = ""
+    session_id = current_session_id()
     if "analysis_feedback" not in st.session_state:
         st.session_state.analysis_feedback = ""
-        
-    if st.session_state.sim_logs_history != "":
-        with st.expander("이전에 진행된(불러온) 시뮬레이션 전체 로그 보기"):
-            st.markdown(st.session_state.sim_logs_history)
+
+    logged_games = session_store.count(session_id, "match")
+    if logged_games:
+        with st.expander(f"이전에 진행된(불러온) 시뮬레이션 전체 로그 보기 ({logged_games}판)"):
+            _render_match_log_viewer(session_id, logged_games)
+            
+    if "sim_results" not in st.session_state:
+        st.session_state.sim_results = append_records(new_results_frame(), list(session_store.iter_events(session_id, "match")))
+
+    if not st.session_state.sim_results.empty:
+        st.subheader("📊 누적 시뮬레이션 통계")
+        render_balance_stats(st.session_state.sim_results, key_prefix="history")
             
     if st.session_state.analysis_feedback != "":
         st.subheader("📈 통계 및 밸런스 분석 피드백 (백업 기반)")
@@ -25,66 +98,97 @@ def render_simulation_dashboard():
         st.markdown(st.session_state.analysis_feedback)
         st.divider()
     
-    col1, col2 = st.columns(2)
+    col1, col2, col3 = st.columns(3)
     with col1:
         num_games = st.number_input("시뮬레이션 진행 판수", min_value=1, max_value=50, value=5)
     with col2:
+        max_concurrency = st.number_input("동시 진행 판수", min_value=1, max_value=10, value=4,
+                                          help="한 번에 몇 판을 병렬로 시뮬레이션할지 설정합니다. 값이 클수록 빨리 끝나지만 API 사용량이 순간적으로 몰립니다.")
+    with col3:
         st.write("")
         st.write("")
         start_btn = st.button("🚀 시뮬레이션 시작", type="primary")
+
+    games_per_call = st.slider("호출 1회당 생성할 판수 (배치 모드)", min_value=1, max_value=10, value=1,
+                               help="2 이상이면 규칙을 한 번만 보내고 여러 판을 JSON으로 한꺼번에 받아 입력 토큰과 요청 수를 줄입니다. 대신 실시간 중계 없이 호출 단위로 결과가 도착합니다.")
+
+    fresh_samples = st.checkbox("매 판 새로 생성 (응답 캐시 우회)", value=True,
+                                help="해제하면 같은 규칙으로 이전에 생성된 경기 결과를 캐시에서 재생합니다. 통계용 표본이 필요하면 켜 두세요.")
+
+    adaptive = st.toggle("적응형 조기 종료", value=False,
+                         help="매 판이 끝날 때마다 승률 추정이 충분히 수렴했는지 확인하고, 수렴하면 남은 판을 실행하지 않습니다. 위의 진행 판수는 최대 판수로 사용됩니다.")
+    if adaptive:
+        ad_col1, ad_col2, ad_col3 = st.columns(3)
+        with ad_col1:
+            min_games = st.number_input("최소 판수", min_value=1, max_value=50, value=min(8, int(num_games)))
+        with ad_col2:
+            ci_width_target = st.slider("목표 신뢰구간 폭", min_value=0.1, max_value=0.6, value=0.3, step=0.05,
+                                        help="최다 승리 팀 승률의 95% 신뢰구간 폭이 이 값 이하가 되면 멈춥니다.")
+        with ad_col3:
+            sprt_delta = st.slider("불균형 기준 (50% 대비 ±)", min_value=0.1, max_value=0.3, value=0.2, step=0.05,
+                                   help="순차확률비검정(SPRT)에서 '불균형'으로 판정할 승률 차이입니다.")
         
     st.divider()
-    
-    # 상태 관리 (진행/중단)
-    if "simulating" not in st.session_state:
-        st.session_state.simulating = False
-    
-    # 멈춤 처리용 변수
-    stop_signal = False
-    
+
+    if "absorbed_job_matches" not in st.session_state:
+        st.session_state.absorbed_job_matches = {}
+
     if start_btn:
-        st.session_state.simulating = True
-        
-    if st.session_state.simulating:
-        stop_btn = st.button("🛑 중단 (진행된 결과 표시)")
-        if stop_btn:
-            stop_signal = True
-            st.session_state.simulating = False
-            
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-        log_box = st.empty()
-        
-        log_box = st.empty()
-        
-        # 새 시뮬레이션이 시작될 경우 이번 회차의 로그를 관리할 변수
-        current_session_logs = ""
-        
-        for i in range(num_games):
-            if stop_signal:
-                status_text.warning("시뮬레이션이 사용자에 의해 중단되었습니다.")
-                break
-                
-            progress_bar.progress((i + 1) / num_games)
-            status_text.text(f"시뮬레이션 진행 중... {i+1}번째 판 실시간 중계 중입니다. 화면을 확인해주세요!")
-            
-            # 실제 LLM 시뮬레이션 호출 (실시간 스트리밍)
-            with st.expander(f"🎲 [신규 게임 {i+1}] 실시간 중계 중...", expanded=True):
-                match_result_text = st.write_stream(stream_simulation_match(st.session_state.final_rules))
-            
-            # 새 세션 로그 및 전역(Session State) 로그에 동시 반영
-            current_session_logs += f"### [신규 게임 {i+1} 요약]\n" + match_result_text + "\n\n"
-            st.session_state.sim_logs_history += f"### [게임 {i+1} 요약]\n" + match_result_text + "\n\n"
-            
-        if not stop_signal:
-            progress_bar.progress(1.0)
-            status_text.success("선택한 모든 판수의 테스트가 완료되었습니다!")
-            st.session_state.simulating = False
-            
-        # 1판 이상 진행되었으면 최종 밸런스 분석 실행
-        if current_session_logs != "":
-            st.subheader("📈 최신 시뮬레이션 결과 및 밸런스 분석 피드백")
-            st.info("AI가 그동안 진행된 플레이 기록을 분석하여 밸런스 구멍이나 필승법을 도출하고 있습니다.")
-            st.session_state.analysis_feedback = st.write_stream(
-                stream_analyze_simulation_results(st.session_state.final_rules, st.session_state.sim_logs_history)
-            )
+        adaptive_config = None
+        if adaptive:
+            adaptive_config = {"min_games": int(min_games), "ci_width_target": ci_width_target, "sprt_delta": sprt_delta}
+        job = job_manager.submit(st.session_state.final_rules, int(num_games), int(max_concurrency),
+                                 use_cache=not fresh_samples, adaptive=adaptive_config, games_per_call=games_per_call,
+                                 session_id=session_id)
+        st.session_state.sim_job_id = job.id
+        # 페이지를 새로고침해도 같은 작업을 다시 찾을 수 있도록 주소에 작업 ID를 남김
+        st.query_params["sim_job"] = job.id
+
+    job_id = st.session_state.get("sim_job_id") or st.query_params.get("sim_job")
+    job = job_manager.get(job_id) if job_id else None
+    if job is None:
+        return
+    st.session_state.sim_job_id = job.id
+
+    if job.is_active:
+        st.caption(f"작업 ID: {job.id} · 탭을 닫아도 시뮬레이션은 서버에서 계속 진행되며, 이 주소로 다시 접속하면 이어서 확인할 수 있습니다.")
+        st.fragment(run_every=1)(_render_job_progress)(job.id)
+        return
+
+    progress = job.snapshot()
+    newly_absorbed = _absorb_job_results(job)
+
+    if progress["status"] == "early_stopped":
+        st.success(f"⏹️ 조기 종료: {progress['early_stop_message']}. "
+                   f"{progress['completed']}판 결과로 판단하여 고정 {progress['total']}판 대비 LLM 호출 {progress['saved_calls']}회를 절약했습니다.")
+    elif progress["status"] == "completed":
+        st.success("선택한 모든 판수의 테스트가 완료되었습니다!")
+    elif progress["status"] == "failed":
+        st.error(f"시뮬레이션 중 오류가 발생했습니다: {progress['error']}")
+    else:
+        st.warning(f"시뮬레이션이 {JOB_STATUS_LABELS[progress['status']]} 상태입니다. ({progress['completed']} / {progress['total']}판 완료)")
+
+    if job.can_resume:
+        if st.button(f"▶️ 남은 {progress['total'] - progress['completed']}판 이어서 진행", type="primary"):
+            job.start()
+            st.rerun()
+
+    # 새로 반영된 판이 있으면 최종 밸런스 분석 실행
+    if newly_absorbed:
+        aborted = {}
+        for index, record in job.ordered_records():
+            reason = ABORT_REASONS.get(record.get("abort_reason"))
+            if reason:
+                aborted[reason] = aborted.get(reason, 0) + 1
+            title = f"중단됨 - {reason}" if reason else (record.get('winning_team') or '결과 불명')
+            with st.expander(f"🎲 [신규 게임 {index+1}] {title}"):
+                st.markdown(record["log"])
+        if aborted:
+            st.caption("한도를 넘어 중단된 판: " + " · ".join(f"{reason} {count}판" for reason, count in aborted.items()))
+        st.subheader("📈 최신 시뮬레이션 결과 및 밸런스 분석 피드백")
+        render_balance_stats(st.session_state.sim_results, key_prefix="latest")
+        st.info("AI가 로컬에서 집계한 승률 통계와 대표 경기 로그를 분석하여 밸런스 구멍이나 필승법을 도출하고 있습니다.")
+        st.session_state.analysis_feedback = st.write_stream(
+            stream_analyze_simulation_results(st.session_state.final_rules, build_analysis_digest(st.session_state.sim_results))
+        )
+        session_store.append(session_id, "analysis", {"text": st.session_state.analysis_feedback})
@@ -0,0 +1,136 @@
+import streamlit as st
+import plotly.graph_objects as go
+from core.llm_engine import invalidate_rulebook_context
+from core.variant_sweep import sweep_manager
+from ui.session import current_session_id, save_state
+
+SWEEP_STATUS_LABELS = {
+    "queued": "대기 중",
+    "running": "진행 중",
+    "completed": "완료",
+    "cancelled": "중단됨",
+    "interrupted": "서버 재시작으로 중단됨",
+    "failed": "오류로 중단됨",
+}
+
+def _ranking_chart(ranking):
+    """후보별 최다 승리 팀 승률 + 95% 신뢰구간 (50% 기준선에 가까울수록 균형)"""
+    ranking = ranking.dropna(subset=["top_rate"])
+    fig = go.Figure(go.Scatter(
+        x=ranking["top_rate"],
+        y=ranking["variant"],
+        mode="markers",
+        error_x=dict(
+            type="data", symmetric=False,
+            array=ranking["ci_high"] - ranking["top_rate"],
+            arrayminus=ranking["top_rate"] - ranking["ci_low"],
+        ),
+        text=ranking["top_team"],
+    ))
+    fig.add_vline(x=0.5, line_dash="dash")
+    fig.update_layout(title="후보별 최다 승리 팀 승률 (95% 신뢰구간)", xaxis=dict(range=[0, 1.05], tickformat=".0%"),
+                      yaxis=dict(autorange="reversed"), height=80 + 40 * len(ranking), margin=dict(t=40, b=10))
+    return fig
+
+PERCENT_COLUMNS = ["top_rate", "ci_low", "ci_high", "gap"]
+
+def _render_ranking(ranking, key_prefix):
+    # 비율은 백분율 값으로 바꿔 printf 형식으로 표시 (Streamlit 버전에 상관없이 같은 표기)
+    display = ranking.copy()
+    display[PERCENT_COLUMNS] = display[PERCENT_COLUMNS].astype(float) * 100
+    st.dataframe(
+        display,
+        hide_index=True,
+        column_config={
+            "rank": "순위", "variant": "후보", "change": "변경 사항", "games": "판수", "top_team": "최다 승리 팀",
+            "top_rate": st.column_config.NumberColumn("승률", format="%.0f%%"),
+            "ci_low": st.column_config.NumberColumn("하한", format="%.0f%%"),
+            "ci_high": st.column_config.NumberColumn("상한", format="%.0f%%"),
+            "gap": st.column_config.NumberColumn("불균형도", format="%.0f%%", help="최다 승리 팀 승률이 50%에서 벗어난 정도"),
+            "gap_low": None, "gap_high": None, "status": "상태",
+        },
+    )
+    if ranking["top_rate"].notna().any():
+        st.plotly_chart(_ranking_chart(ranking), use_container_width=True, key=f"{key_prefix}_sweep_chart")
+
+def _render_sweep_progress(job_id):
+    """진행 중인 스윕의 라운드/예산 사용량과 중간 순위표. fragment로 감싸 이 부분만 1초마다 다시 그립니다."""
+    job = sweep_manager.get(job_id)
+    progress = job.snapshot()
+
+    if progress["phase"] == "generating":
+        st.progress(0.0, text="변형 룰북을 생성하고 있습니다...")
+    else:
+        st.progress(min(1.0, progress["used"] / progress["budget"]),
+                    text=f"{progress['round'] + 1}라운드 진행 중 · 남은 후보 {progress['active']}개 · "
+                         f"예산 {progress['used']} / {progress['budget']}판 사용")
+    if st.button("🛑 스윕 중단 (진행된 결과 표시)", key=f"cancel_sweep_{job_id}"):
+        job.cancel()
+    _render_ranking(progress["ranking"], key_prefix="live")
+
+    if not job.is_active:
+        st.rerun()
+
+def render_variant_sweep():
+    """확정된 룰북의 변형 여러 개를 하나의 예산으로 비교해 가장 균형 잡힌 규칙을 찾는 스윕"""
+    st.write("변경 사항마다 변형 룰북을 만든 뒤, 하나의 시뮬레이션 예산을 나눠 씁니다. "
+             "아직 불확실하거나 최선에 가까운 후보에 판을 더 배분하고, 확실히 불균형한 후보는 라운드마다 탈락시킵니다.")
+
+    changes_text = st.text_area("비교할 변경 사항 (한 줄에 하나)", height=120,
+                                placeholder="플레이어 수를 8명으로 늘리고 마피아를 2명으로\n의사 역할 제거\n첫날 밤에는 아무도 죽지 않는 특수 규칙 추가")
+    include_original = st.checkbox("원본 규칙도 후보에 포함", value=True)
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        budget = st.number_input("전체 시뮬레이션 예산 (판)", min_value=4, max_value=500, value=40,
+                                 help="모든 후보가 나눠 쓰는 총 판수입니다. 후보가 1개만 남으면 예산을 다 쓰기 전에 멈춥니다.")
+    with col2:
+        min_games_per_round = st.number_input("라운드당 후보별 최소 판수", min_value=1, max_value=20, value=4)
+    with col3:
+        sweep_concurrency = st.number_input("동시 진행 판수", min_value=1, max_value=10, value=4, key="sweep_concurrency")
+
+    changes = [line.strip() for line in changes_text.splitlines() if line.strip()]
+    if st.button("🧪 변형 비교 시작", type="primary", disabled=len(changes) + include_original < 2):
+        job = sweep_manager.submit(st.session_state.final_rules, changes, int(budget), int(sweep_concurrency),
+                                   int(min_games_per_round), include_original, session_id=current_session_id())
+        st.session_state.sweep_job_id = job.id
+        # 페이지를 새로고침해도 같은 스윕을 다시 찾을 수 있도록 주소에 작업 ID를 남김
+        st.query_params["sweep_job"] = job.id
+
+    job_id = st.session_state.get("sweep_job_id") or st.query_params.get("sweep_job")
+    job = sweep_manager.get(job_id) if job_id else None
+    if job is None:
+        return
+    st.session_state.sweep_job_id = job.id
+
+    if job.is_active:
+        st.fragment(run_every=1)(_render_sweep_progress)(job.id)
+        return
+
+    progress = job.snapshot()
+    ranking = progress["ranking"]
+    if progress["status"] == "completed":
+        best = ranking.iloc[0]
+        # 균등 배분이었다면 모든 후보가 1위 후보만큼의 판수를 써야 같은 정밀도로 비교 가능
+        uniform = int(best["games"]) * len(ranking)
+        st.success(f"스윕 완료: {progress['round']}라운드 동안 {progress['used']}판을 사용했습니다. "
+                   f"같은 정밀도의 균등 배분(후보별 {int(best['games'])}판)이었다면 {uniform}판이 필요합니다.")
+    elif progress["status"] == "failed":
+        st.error(f"스윕 중 오류가 발생했습니다: {progress['error']}")
+    else:
+        st.warning(f"스윕이 {SWEEP_STATUS_LABELS[progress['status']]} 상태입니다. ({progress['used']} / {progress['budget']}판 사용)")
+    if job.can_resume:
+        if st.button("▶️ 남은 예산으로 스윕 이어서 진행", type="primary"):
+            job.start()
+            st.rerun()
+
+    _render_ranking(ranking, key_prefix="final")
+
+    best_index = next(index for index, variant in enumerate(job.variants) if variant["name"] == ranking.iloc[0]["variant"])
+    best_rules = job.variants[best_index]["rules_text"]
+    if best_rules and best_rules != st.session_state.final_rules:
+        with st.expander(f"🏆 1위 후보({ranking.iloc[0]['variant']}) 룰북 보기"):
+            st.markdown(best_rules)
+            if st.button("이 룰북을 확정 규칙으로 적용"):
+                invalidate_rulebook_context(st.session_state.final_rules)
+                save_state("final_rules", best_rules)
+                st.success("1위 후보의 룰북을 확정 규칙으로 적용했습니다.")